@@ -2,13 +2,61 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from utils.pool_metrics import pool_metrics
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Connection pool: per-process limits, and how long a request may wait for a
+# free connection before failing instead of queueing indefinitely.
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+
+# Timeouts (ms); an empty socket timeout keeps the driver default (none)
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '')
+
+# Wire compression, e.g. "zstd,snappy,zlib"; zstd and snappy need the
+# zstandard / python-snappy packages, otherwise the driver skips them
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')
+
+# Read/write concern; empty values keep the server defaults
+MONGO_READ_CONCERN = os.environ.get('MONGO_READ_CONCERN', '')
+MONGO_WRITE_CONCERN = os.environ.get('MONGO_WRITE_CONCERN', '')
+MONGO_JOURNAL = os.environ.get('MONGO_JOURNAL', '')
+
+MONGO_APP_NAME = os.environ.get('MONGO_APP_NAME', 'topcopy-backend')
+
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "appname": MONGO_APP_NAME,
+        "event_listeners": [pool_metrics]
+    }
+    if MONGO_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = int(MONGO_SOCKET_TIMEOUT_MS)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    if MONGO_READ_CONCERN:
+        options["readConcernLevel"] = MONGO_READ_CONCERN
+    if MONGO_WRITE_CONCERN:
+        # "majority" or a number of nodes
+        options["w"] = int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+    if MONGO_JOURNAL:
+        options["journal"] = MONGO_JOURNAL.lower() in ('1', 'true', 'yes')
+    return options
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, **client_options())
 db = client[os.environ['DB_NAME']]
 
 # Export client and db
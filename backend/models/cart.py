@@ -20,6 +20,9 @@ class CartItem(BaseModel):
 class Cart(BaseModel):
     user_id: str
     items: List[CartItem] = []
+    # Kept in step with items by the same update that changes them
+    total: float = 0
+    item_count: int = 0
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class CartItemCreate(BaseModel):
@@ -38,4 +41,16 @@ class CartItemCreate(BaseModel):
 
 class CartResponse(BaseModel):
     items: List[CartItem]
-    total: float
\ No newline at end of file
+    total: float
+    item_count: int = 0
+
+class CartCount(BaseModel):
+    item_count: int
+    total: float
+
+# Upper bound on items added or removed by one PATCH /cart/items
+MAX_CART_PATCH_ITEMS = 200
+
+class CartItemsPatch(BaseModel):
+    add: List[CartItemCreate] = Field(default_factory=list, max_length=MAX_CART_PATCH_ITEMS)
+    remove: List[str] = Field(default_factory=list, max_length=MAX_CART_PATCH_ITEMS)
\ No newline at end of file
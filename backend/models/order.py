@@ -1,8 +1,21 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, FrozenSet, List, Literal, Optional
 from datetime import datetime
 import uuid
 
+OrderStatus = Literal['pending', 'processing', 'completed', 'cancelled']
+
+# Allowed status changes; completed and cancelled are final
+ORDER_TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    'pending': frozenset({'processing', 'completed', 'cancelled'}),
+    'processing': frozenset({'completed', 'cancelled'}),
+    'completed': frozenset(),
+    'cancelled': frozenset()
+}
+
+def can_transition(current: str, target: str) -> bool:
+    return target in ORDER_TRANSITIONS.get(current, frozenset())
+
 class OrderItem(BaseModel):
     paper_size: str
     color_class: str
@@ -22,6 +35,8 @@ class Order(BaseModel):
     user_id: str
     items: List[OrderItem]
     total_amount: float
+    # Stored so list views can show it without reading the items
+    item_count: int = 0
     status: str = 'pending'  # pending, processing, completed, cancelled
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -34,6 +49,23 @@ class OrderResponse(BaseModel):
     user_id: str
     items: List[OrderItem]
     total_amount: float
+    item_count: int = 0
+    status: str
+    created_at: datetime
+    updated_at: datetime
+
+class OrderSummary(BaseModel):
+    """Row of an order list (?view=summary); items stay in the database"""
+    id: str
     status: str
+    total_amount: float
+    item_count: int
     created_at: datetime
-    updated_at: datetime
\ No newline at end of file
+
+class OrderPage(BaseModel):
+    orders: List[OrderResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+class OrderSummaryPage(BaseModel):
+    orders: List[OrderSummary]
+    next_cursor: Optional[str] = None
\ No newline at end of file
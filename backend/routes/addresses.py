@@ -1,33 +1,14 @@
-from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi import APIRouter, HTTPException, Depends
 from database import db
-from utils.auth import decode_access_token
+from utils.dependencies import get_current_user_id
 from models.address import AddressCreate, AddressUpdate, AddressResponse
 from typing import List
 from datetime import datetime
 
 router = APIRouter(prefix="/addresses", tags=["addresses"])
 
-# Authentication dependency
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(status_code=401, detail="توکن نامعتبر است")
-    
-    user_id = payload.get("sub")
-    user = await db.users.find_one({"id": user_id})
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="کاربر پیدا نشد")
-    
-    return user_id
-
 @router.get("/", response_model=List[AddressResponse])
-async def get_user_addresses(current_user: str = Depends(get_current_user)):
+async def get_user_addresses(current_user: str = Depends(get_current_user_id)):
     """دریافت تمام آدرس‌های کاربر"""
     addresses = await db.addresses.find({"user_id": current_user}).to_list(100)
     
@@ -39,7 +20,7 @@ async def get_user_addresses(current_user: str = Depends(get_current_user)):
 @router.post("/", response_model=AddressResponse, status_code=201)
 async def create_address(
     address: AddressCreate,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user_id)
 ):
     """ایجاد آدرس جدید"""
     import uuid
@@ -65,7 +46,7 @@ async def create_address(
 @router.get("/{address_id}", response_model=AddressResponse)
 async def get_address(
     address_id: str,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user_id)
 ):
     """دریافت یک آدرس خاص"""
     address = await db.addresses.find_one({"id": address_id, "user_id": current_user})
@@ -80,7 +61,7 @@ async def get_address(
 async def update_address(
     address_id: str,
     address_update: AddressUpdate,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user_id)
 ):
     """به‌روزرسانی آدرس"""
     # بررسی وجود آدرس
@@ -112,7 +93,7 @@ async def update_address(
 @router.delete("/{address_id}", status_code=204)
 async def delete_address(
     address_id: str,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user_id)
 ):
     """حذف آدرس"""
     result = await db.addresses.delete_one({"id": address_id, "user_id": current_user})
@@ -125,7 +106,7 @@ async def delete_address(
 @router.post("/{address_id}/set-default", response_model=AddressResponse)
 async def set_default_address(
     address_id: str,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user_id)
 ):
     """تعیین آدرس به عنوان پیش‌فرض"""
     # بررسی وجود آدرس
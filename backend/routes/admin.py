@@ -1,37 +1,54 @@
-from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from pymongo import UpdateOne
 from database import db
-from utils.auth import decode_access_token
-from typing import List, Optional
+from models.order import OrderStatus, OrderSummary, can_transition
+from routes.orders import fill_item_counts
+from utils.dependencies import verify_admin, token_epochs
+from utils.pricing import PricingConfigError
+from utils.pricing_engine import pricing_engine
+from utils.responses import model_projection, trusted_response
+from utils.pagination import KEYSET_SORT, encode_cursor, keyset_page
+from typing import AsyncIterator, List, Optional
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+import csv
+import io
+import os
+import orjson
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-# Admin check
-async def verify_admin(authorization: str = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(status_code=401, detail="توکن نامعتبر است")
-    
-    user_id = payload.get("sub")
-    user = await db.users.find_one({"id": user_id})
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="کاربر پیدا نشد")
-    
-    # Check if user is admin (you can add is_admin field to user model)
-    if not user.get('is_admin', False):
-        raise HTTPException(status_code=403, detail="دسترسی محدود به ادمین")
-    
-    return user_id
+MAX_PAGE_SIZE = 1000
+
+ORDER_SUMMARY_PROJECTION = model_projection(OrderSummary, "user_id")
+
+# Upper bound on orders moved by one bulk status request
+MAX_BULK_STATUS_ORDERS = 500
+
+# Largest batch of orders the streaming export fetches and joins users for
+# at once, so memory stays bounded by this, not by the result size. Batches
+# start at one order and double up to it, so the first row goes out as soon
+# as the first order and its user have been read.
+ORDER_EXPORT_BATCH_SIZE = int(os.environ.get('ORDER_EXPORT_BATCH_SIZE', '100'))
+
+ORDER_EXPORT_COLUMNS = [
+    "id", "created_at", "updated_at", "status", "user_id", "user_name", "user_phone",
+    "item_count", "total_pages", "total_amount"
+]
+
+# A spreadsheet reads a cell starting with one of these as a formula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
 
 class OrderStatusUpdate(BaseModel):
-    status: str  # pending, processing, completed, cancelled
+    status: OrderStatus
+
+class BulkOrderStatusUpdate(BaseModel):
+    order_ids: List[str] = Field(..., min_length=1, max_length=MAX_BULK_STATUS_ORDERS)
+    status: OrderStatus
+
+class UserRoleUpdate(BaseModel):
+    is_admin: bool
 
 class PricingUpdate(BaseModel):
     color_class_id: str
@@ -78,51 +95,209 @@ async def get_dashboard_stats(admin_id: str = Depends(verify_admin)):
     }
 
 # Orders Management
+async def _attach_users(orders: List[dict]) -> List[dict]:
+    """Add user_name/user_phone to each order with one users query"""
+    user_ids = list({order['user_id'] for order in orders})
+    users = await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "name": 1, "phone": 1}).to_list(len(user_ids))
+    users_by_id = {user['id']: user for user in users}
+    
+    for order in orders:
+        user = users_by_id.get(order['user_id'])
+        if user:
+            order['user_name'] = user.get('name', 'نامشخص')
+            order['user_phone'] = user.get('phone', 'نامشخص')
+    return orders
+
+async def _page(collection, query: dict, projection: dict, limit: int, skip: int, cursor: Optional[str]):
+    """Keyset page unless the caller still pages with ``skip``; returns the
+    documents and the cursor of the next page either way"""
+    if cursor or not skip:
+        try:
+            return await keyset_page(collection, query, projection, limit, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="نشانگر صفحه نامعتبر است")
+    
+    docs = await collection.find(query, projection).sort(KEYSET_SORT).skip(skip).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1])
+
 @router.get("/orders")
 async def get_all_orders(
     status: Optional[str] = None,
-    limit: int = 100,
-    skip: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
     admin_id: str = Depends(verify_admin)
 ):
     query = {}
     if status:
         query['status'] = status
     
-    orders = await db.orders.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    # Summary rows keep user_id so the customer can still be joined in
+    projection = ORDER_SUMMARY_PROJECTION if view == "summary" else {"_id": 0}
+    orders, next_cursor = await _page(db.orders, query, projection, limit, skip, cursor)
     total = await db.orders.count_documents(query)
     
-    # Get user info for each order and remove _id
-    for order in orders:
-        order.pop('_id', None)  # Remove MongoDB _id
-        user = await db.users.find_one({"id": order['user_id']})
-        if user:
-            order['user_name'] = user.get('name', 'نامشخص')
-            order['user_phone'] = user.get('phone', 'نامشخص')
+    await fill_item_counts(orders)
+    await _attach_users(orders)
     
-    return {
+    return trusted_response({
         "orders": orders,
         "total": total,
-        "page": skip // limit + 1,
-        "pages": (total + limit - 1) // limit
-    }
+        "page": None if cursor else skip // limit + 1,
+        "pages": (total + limit - 1) // limit,
+        "next_cursor": next_cursor
+    })
+
+async def _export_batches(query: dict) -> AsyncIterator[List[dict]]:
+    cursor = db.orders.find(query, {"_id": 0}).sort([("created_at", 1), ("id", 1)]).batch_size(ORDER_EXPORT_BATCH_SIZE)
+    batch = []
+    batch_size = 1
+    
+    async for order in cursor:
+        batch.append(order)
+        if len(batch) >= batch_size:
+            yield await _attach_users(batch)
+            batch = []
+            batch_size = min(batch_size * 2, ORDER_EXPORT_BATCH_SIZE)
+    
+    if batch:
+        yield await _attach_users(batch)
+
+def _csv_cell(value):
+    # User names come from self-registration; the leading quote keeps one
+    # like =HYPERLINK(...) as text when the export is opened in a spreadsheet
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def _csv_row(order: dict) -> list:
+    items = order.get('items', [])
+    return [_csv_cell(value) for value in [
+        order['id'],
+        order['created_at'].isoformat(),
+        order['updated_at'].isoformat() if order.get('updated_at') else '',
+        order.get('status', ''),
+        order['user_id'],
+        order.get('user_name', ''),
+        order.get('user_phone', ''),
+        len(items),
+        sum(item.get('pages', 0) * item.get('copies', 0) for item in items),
+        order.get('total_amount', 0)
+    ]]
+
+async def _ndjson_stream(query: dict) -> AsyncIterator[bytes]:
+    async for batch in _export_batches(query):
+        yield b"".join(orjson.dumps(order) + b"\n" for order in batch)
+
+async def _csv_stream(query: dict) -> AsyncIterator[bytes]:
+    # BOM so spreadsheet apps read the Persian names as UTF-8; sent with the
+    # header row before the first query so the download starts at once
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ORDER_EXPORT_COLUMNS)
+    yield ("\ufeff" + buffer.getvalue()).encode('utf-8')
+    
+    async for batch in _export_batches(query):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_csv_row(order) for order in batch)
+        yield buffer.getvalue().encode('utf-8')
+
+@router.get("/orders/export")
+async def export_orders(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    admin_id: str = Depends(verify_admin)
+):
+    """Stream every matching order, oldest first, as NDJSON (full orders)
+    or CSV (one summary row per order)"""
+    query = {}
+    if status:
+        query['status'] = status
+    if start_date or end_date:
+        query['created_at'] = {}
+        if start_date:
+            query['created_at']['$gte'] = start_date
+        if end_date:
+            query['created_at']['$lt'] = end_date
+    
+    filename = f"orders-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    
+    if export_format == "csv":
+        return StreamingResponse(_csv_stream(query), media_type="text/csv; charset=utf-8", headers=headers)
+    return StreamingResponse(_ndjson_stream(query), media_type="application/x-ndjson", headers=headers)
 
 @router.get("/orders/{order_id}")
 async def get_order_detail(order_id: str, admin_id: str = Depends(verify_admin)):
-    order = await db.orders.find_one({"id": order_id})
+    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
     
     if not order:
         raise HTTPException(status_code=404, detail="سفارش پیدا نشد")
     
-    order.pop('_id', None)  # Remove MongoDB _id
-    
     # Get user info
     user = await db.users.find_one({"id": order['user_id']})
     if user:
         order['user_name'] = user.get('name', 'نامشخص')
         order['user_phone'] = user.get('phone', 'نامشخص')
     
-    return order
+    await fill_item_counts([order])
+    return trusted_response(order)
+
+async def _apply_status(order_ids: List[str], target: str, admin_id: str) -> List[dict]:
+    """Move orders to ``target`` where the state machine allows it.
+    
+    Every allowed change is one UpdateOne in a single unordered bulk_write,
+    conditioned on the status read just before, so an order changed
+    concurrently is reported as a conflict instead of being overwritten.
+    Returns one result per distinct order id, in request order.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    orders = await db.orders.find({"id": {"$in": order_ids}}, {"_id": 0, "id": 1, "status": 1}).to_list(len(order_ids))
+    current = {order['id']: order.get('status') for order in orders}
+    now = datetime.utcnow()
+    
+    results = {}
+    operations = []
+    for order_id in order_ids:
+        status = current.get(order_id)
+        if order_id not in current:
+            results[order_id] = {"order_id": order_id, "result": "not_found"}
+        elif status == target:
+            results[order_id] = {"order_id": order_id, "result": "unchanged", "status": status}
+        elif not can_transition(status, target):
+            results[order_id] = {"order_id": order_id, "result": "invalid_transition", "from": status, "to": target}
+        else:
+            results[order_id] = {"order_id": order_id, "result": "updated", "from": status, "to": target}
+            operations.append(UpdateOne(
+                {"id": order_id, "status": status},
+                {
+                    "$set": {"status": target, "updated_at": now, f"status_timestamps.{target}": now},
+                    "$push": {"status_history": {"from": status, "to": target, "at": now, "by": admin_id}}
+                }
+            ))
+    
+    if operations:
+        write = await db.orders.bulk_write(operations, ordered=False)
+        
+        if write.matched_count < len(operations):
+            # Some filters missed because the status moved in between; find
+            # which by checking which orders did not end up at the target
+            updated_ids = [order_id for order_id, result in results.items() if result['result'] == 'updated']
+            moved = await db.orders.find(
+                {"id": {"$in": updated_ids}, "status": {"$ne": target}}, {"_id": 0, "id": 1, "status": 1}
+            ).to_list(len(updated_ids))
+            for order in moved:
+                results[order['id']] = {"order_id": order['id'], "result": "conflict", "status": order.get('status')}
+    
+    return [results[order_id] for order_id in order_ids]
 
 @router.put("/orders/{order_id}/status")
 async def update_order_status(
@@ -130,40 +305,74 @@ async def update_order_status(
     status_update: OrderStatusUpdate,
     admin_id: str = Depends(verify_admin)
 ):
-    result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"status": status_update.status, "updated_at": datetime.utcnow()}}
-    )
+    result, = await _apply_status([order_id], status_update.status, admin_id)
     
-    if result.modified_count == 0:
+    if result['result'] == 'not_found':
         raise HTTPException(status_code=404, detail="سفارش پیدا نشد")
+    if result['result'] == 'invalid_transition':
+        raise HTTPException(status_code=400, detail="تغییر وضعیت سفارش مجاز نیست")
+    if result['result'] == 'conflict':
+        raise HTTPException(status_code=409, detail="وضعیت سفارش همزمان تغییر کرد")
     
     return {"message": "وضعیت سفارش به‌روز شد", "status": status_update.status}
 
+@router.post("/orders/status")
+async def bulk_update_order_status(
+    status_update: BulkOrderStatusUpdate,
+    admin_id: str = Depends(verify_admin)
+):
+    """Move many orders to one status; returns a result per order"""
+    results = await _apply_status(status_update.order_ids, status_update.status, admin_id)
+    
+    return {
+        "status": status_update.status,
+        "updated": sum(1 for result in results if result['result'] == 'updated'),
+        "results": results
+    }
+
 # Users Management
 @router.get("/users")
 async def get_all_users(
-    limit: int = 100,
-    skip: int = 0,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
     admin_id: str = Depends(verify_admin)
 ):
-    users = await db.users.find({}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    # Never return password hashes
+    users, next_cursor = await _page(db.users, {}, {"_id": 0, "password": 0}, limit, skip, cursor)
     total = await db.users.count_documents({})
     
-    # Get order count for each user and remove MongoDB _id
+    # Get order count for each user
     for user in users:
-        user.pop('_id', None)  # Remove MongoDB _id
         order_count = await db.orders.count_documents({"user_id": user['id']})
         user['order_count'] = order_count
-        # Remove password from response
-        user.pop('password', None)
     
-    return {
+    return trusted_response({
         "users": users,
         "total": total,
-        "page": skip // limit + 1,
-        "pages": (total + limit - 1) // limit
-    }
+        "page": None if cursor else skip // limit + 1,
+        "pages": (total + limit - 1) // limit,
+        "next_cursor": next_cursor
+    })
+
+@router.put("/users/{user_id}/role")
+async def update_user_role(
+    user_id: str,
+    role_update: UserRoleUpdate,
+    admin_id: str = Depends(verify_admin)
+):
+    result = await db.users.update_one(
+        {"id": user_id},
+        {"$set": {"is_admin": role_update.is_admin, "updated_at": datetime.utcnow()}}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="کاربر پیدا نشد")
+    
+    # Tokens carry the role claim, so revoke the ones issued under the old role
+    await token_epochs.bump(user_id)
+    
+    return {"message": "نقش کاربر به‌روز شد", "is_admin": role_update.is_admin}
 
 @router.get("/users/{user_id}/orders")
 async def get_user_orders(user_id: str, admin_id: str = Depends(verify_admin)):
@@ -190,47 +399,12 @@ async def get_user_orders(user_id: str, admin_id: str = Depends(verify_admin)):
 # Pricing Management
 @router.get("/pricing")
 async def get_pricing_config(admin_id: str = Depends(verify_admin)):
-    # Try to get pricing from database first
-    pricing_doc = await db.pricing_config.find_one({"id": "pricing_config"})
-    
-    if not pricing_doc:
-        # If no pricing in DB, initialize from hardcoded values
-        from utils.pricing import paper_sizes, color_classes, print_types, services, pricing_tiers
-        pricing_data = {
-            "id": "pricing_config",
-            "paper_sizes": paper_sizes,
-            "color_classes": color_classes,
-            "print_types": print_types,
-            "services": services,
-            "pricing_tiers": pricing_tiers
-        }
-        await db.pricing_config.insert_one(pricing_data)
-        pricing_doc = pricing_data
-    
-    # Remove MongoDB _id
-    pricing_doc.pop('_id', None)
-    return pricing_doc
+    return await pricing_engine.get_config()
 
 @router.post("/pricing/initialize")
 async def initialize_pricing(admin_id: str = Depends(verify_admin)):
     """Initialize or reset pricing to default values"""
-    from utils.pricing import paper_sizes, color_classes, print_types, services, pricing_tiers
-    
-    pricing_data = {
-        "id": "pricing_config",
-        "paper_sizes": paper_sizes,
-        "color_classes": color_classes,
-        "print_types": print_types,
-        "services": services,
-        "pricing_tiers": pricing_tiers
-    }
-    
-    # Upsert (update if exists, insert if not)
-    await db.pricing_config.replace_one(
-        {"id": "pricing_config"},
-        pricing_data,
-        upsert=True
-    )
+    pricing_data = await pricing_engine.reset(admin_id)
     
     return {"message": "قیمت‌ها با موفقیت مقداردهی شدند", "data": pricing_data}
 
@@ -245,34 +419,15 @@ async def update_service_price(
     admin_id: str = Depends(verify_admin)
 ):
     """Update service pricing"""
-    pricing_doc = await db.pricing_config.find_one({"id": "pricing_config"})
-    
-    if not pricing_doc:
-        raise HTTPException(status_code=404, detail="تنظیمات قیمت پیدا نشد")
-    
-    # Find and update the service
-    services = pricing_doc.get('services', [])
-    service_found = False
-    
-    for service in services:
-        if service['id'] == service_id:
-            service['price'] = service_update.price
-            if service_update.min_pages is not None:
-                service['min_pages'] = service_update.min_pages
-            elif 'min_pages' in service and service_update.min_pages is None:
-                # Keep existing min_pages if not provided
-                pass
-            service_found = True
-            break
-    
-    if not service_found:
-        raise HTTPException(status_code=404, detail="خدمت پیدا نشد")
-    
-    # Update in database
-    await db.pricing_config.update_one(
-        {"id": "pricing_config"},
-        {"$set": {"services": services}}
-    )
+    try:
+        await pricing_engine.update_service(
+            service_id,
+            service_update.price,
+            min_pages=service_update.min_pages,
+            admin_id=admin_id
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     
     return {"message": "قیمت خدمت با موفقیت به‌روز شد", "service_id": service_id}
 
@@ -290,39 +445,22 @@ async def update_pricing_tier(
     admin_id: str = Depends(verify_admin)
 ):
     """Update pricing tier for a specific color class"""
-    pricing_doc = await db.pricing_config.find_one({"id": "pricing_config"})
-    
-    if not pricing_doc:
-        raise HTTPException(status_code=404, detail="تنظیمات قیمت پیدا نشد")
-    
-    pricing_tiers = pricing_doc.get('pricing_tiers', {})
-    
-    if color_class_id not in pricing_tiers:
-        raise HTTPException(status_code=404, detail="کلاس رنگی پیدا نشد")
-    
-    tiers = pricing_tiers[color_class_id]
-    
-    if tier_index < 0 or tier_index >= len(tiers):
-        raise HTTPException(status_code=404, detail="رده قیمتی پیدا نشد")
-    
-    # Update the tier
-    tiers[tier_index] = {
-        'min': tier_update.min,
-        'max': tier_update.max,
-        'single': tier_update.single,
-        'double': tier_update.double
-    }
-    
-    pricing_tiers[color_class_id] = tiers
-    
-    # Update in database
-    await db.pricing_config.update_one(
-        {"id": "pricing_config"},
-        {"$set": {"pricing_tiers": pricing_tiers}}
-    )
+    try:
+        compiled = await pricing_engine.update_tier(
+            color_class_id,
+            tier_index,
+            tier_update.dict(),
+            admin_id=admin_id
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PricingConfigError as e:
+        # Reject overlapping or inverted tiers before they reach the quote path
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "message": "تعرفه با موفقیت به‌روز شد",
         "color_class_id": color_class_id,
-        "tier_index": tier_index
+        "tier_index": tier_index,
+        "gaps": [list(gap) for gap in compiled.gaps]
     }
\ No newline at end of file
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi import APIRouter, HTTPException, Depends
 from models.user import UserCreate, UserLogin, UserResponse, AuthResponse
-from utils.auth import hash_password, verify_password, create_access_token, decode_access_token
+from utils.auth import hash_password_async, verify_password_async, create_access_token, PasswordHasherBusy
+from utils.dependencies import get_current_user, get_current_user_id, invalidate_user, token_epochs
 from database import db
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="سرور مشغول است، لطفاً چند لحظه دیگر دوباره تلاش کنید",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/register", response_model=AuthResponse)
 async def register(user_data: UserCreate):
     # Check if user already exists
@@ -13,7 +21,10 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="شماره تلفن قبلاً ثبت شده است")
     
     # Hash password
-    hashed_password = hash_password(user_data.password)
+    try:
+        hashed_password = await hash_password_async(user_data.password)
+    except PasswordHasherBusy:
+        raise _busy()
     
     # Create user
     from models.user import User
@@ -25,6 +36,7 @@ async def register(user_data: UserCreate):
     
     # Insert into database
     await db.users.insert_one(user.dict())
+    invalidate_user(user.id)
     
     # Create token
     token = create_access_token(data={"sub": user.id, "phone": user.phone})
@@ -47,11 +59,20 @@ async def login(credentials: UserLogin):
         raise HTTPException(status_code=401, detail="شماره تلفن یا رمز عبور اشتباه است")
     
     # Verify password
-    if not verify_password(credentials.password, user['password']):
+    try:
+        password_ok = await verify_password_async(credentials.password, user['password'])
+    except PasswordHasherBusy:
+        raise _busy()
+    
+    if not password_ok:
         raise HTTPException(status_code=401, detail="شماره تلفن یا رمز عبور اشتباه است")
     
     # Create token
-    token = create_access_token(data={"sub": user['id'], "phone": user['phone']})
+    token = create_access_token(
+        data={"sub": user['id'], "phone": user['phone']},
+        role="admin" if user.get('is_admin', False) else "user",
+        epoch=user.get('token_epoch', 0)
+    )
     
     # Return response
     user_response = UserResponse(
@@ -64,25 +85,16 @@ async def login(credentials: UserLogin):
     return AuthResponse(user=user_response, token=token)
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(status_code=401, detail="توکن نامعتبر است")
-    
-    user_id = payload.get("sub")
-    user = await db.users.find_one({"id": user_id})
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="کاربر پیدا نشد")
-    
+async def get_me(user: dict = Depends(get_current_user)):
     return UserResponse(
         id=user['id'],
         phone=user['phone'],
         name=user.get('name'),
         created_at=user['created_at']
-    )
\ No newline at end of file
+    )
+
+@router.post("/logout-all")
+async def logout_everywhere(user_id: str = Depends(get_current_user_id)):
+    """Revoke every token issued to the current user"""
+    await token_epochs.bump(user_id)
+    return {"message": "از همه دستگاه‌ها خارج شدید"}
\ No newline at end of file
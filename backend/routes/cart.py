@@ -1,116 +1,141 @@
-from fastapi import APIRouter, HTTPException, Header
-from models.cart import CartItemCreate, CartResponse, CartItem, Cart
-from utils.auth import decode_access_token
+from fastapi import APIRouter, Depends
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models.cart import CartItemCreate, CartItemsPatch, CartResponse, CartCount, CartItem
+from utils.dependencies import get_current_user_id
+from utils.responses import model_projection, trusted_response
+from typing import List, Optional
 from datetime import datetime
 import uuid
 from database import db
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
-async def get_user_from_token(authorization: str):
-    if not authorization or not authorization.startswith("Bearer "):
-        return None
+CART_PROJECTION = model_projection(CartResponse)
+
+# Field values of an emptied cart; also used when an order clears it
+EMPTY_CART = {"items": [], "total": 0, "item_count": 0}
+
+async def _update_cart(query: dict, update, upsert: bool = False) -> Optional[dict]:
+    """Apply ``update`` to the cart matching ``query`` in one round trip and
+    return it as it is afterwards (None if nothing matched and upsert is off)"""
+    for attempt in range(2):
+        try:
+            return await db.carts.find_one_and_update(
+                query,
+                update,
+                projection=CART_PROJECTION,
+                upsert=upsert,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two first-time upserts raced on the unique user_id index; the
+            # loser retries as a plain update of the cart the winner created
+            if attempt:
+                raise
+
+def _items_update(new_items: List[dict], remove_ids: List[str]) -> List[dict]:
+    # An update pipeline recomputes total and item_count from the items it
+    # leaves behind: removing never has to read the removed items' prices
+    # first, and a cart stored before those fields existed is corrected by
+    # its next change. The client values are wrapped in $literal so they are
+    # never read as expressions
+    items = {"$ifNull": ["$items", []]}
+    if remove_ids:
+        items = {
+            "$filter": {
+                "input": items,
+                "as": "item",
+                "cond": {"$eq": [{"$in": ["$$item.id", {"$literal": remove_ids}]}, False]}
+            }
+        }
     
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
+    return [
+        {"$set": {"items": {"$concatArrays": [items, {"$literal": new_items}]}}},
+        {"$set": {
+            "total": {"$sum": "$items.total_price"},
+            "item_count": {"$size": "$items"},
+            "updated_at": datetime.utcnow()
+        }}
+    ]
+
+async def _change_items(user_id: str, new_items: List[dict] = (), remove_ids: List[str] = ()) -> Optional[dict]:
+    """Add ``new_items`` and remove ``remove_ids`` in one atomic update that
+    also recomputes the stored total and item_count"""
+    new_items, remove_ids = list(new_items), list(remove_ids)
     
-    if not payload:
-        return None
+    if not new_items and not remove_ids:
+        return await db.carts.find_one({"user_id": user_id}, CART_PROJECTION)
     
-    return payload.get("sub")
+    # Only an add may create the cart
+    return await _update_cart({"user_id": user_id}, _items_update(new_items, remove_ids), upsert=bool(new_items))
+
+def _cart_response(cart: Optional[dict]):
+    if not cart:
+        return trusted_response({"items": [], "total": 0, "item_count": 0})
+    
+    # Items were built from CartItem when added, so they go out as stored;
+    # carts not yet backfilled (see utils.backfills) have no stored totals
+    items = cart['items']
+    return trusted_response({
+        "items": items,
+        "total": cart.get('total', sum(item['total_price'] for item in items)),
+        "item_count": cart.get('item_count', len(items))
+    })
 
 @router.post("/", response_model=CartResponse)
-async def add_to_cart(item: CartItemCreate, authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
-    
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    # Get or create cart
-    cart = await db.carts.find_one({"user_id": user_id})
-    
+async def add_to_cart(item: CartItemCreate, user_id: str = Depends(get_current_user_id)):
     cart_item = CartItem(
         id=str(uuid.uuid4()),
         **item.dict()
     )
     
-    if cart:
-        # Add item to existing cart
-        await db.carts.update_one(
-            {"user_id": user_id},
-            {
-                "$push": {"items": cart_item.dict()},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
-        updated_cart = await db.carts.find_one({"user_id": user_id})
-    else:
-        # Create new cart
-        new_cart = Cart(
-            user_id=user_id,
-            items=[cart_item]
-        )
-        await db.carts.insert_one(new_cart.dict())
-        updated_cart = new_cart.dict()
+    # Creates the cart on first add; carts.user_id is unique, so concurrent
+    # adds can never produce two carts for one user
+    cart = await _change_items(user_id, new_items=[cart_item.dict()])
     
-    items = [CartItem(**item) for item in updated_cart['items']]
-    total = sum(item.total_price for item in items)
+    return _cart_response(cart)
+
+@router.patch("/items", response_model=CartResponse)
+async def update_cart_items(patch: CartItemsPatch, user_id: str = Depends(get_current_user_id)):
+    """Add and remove many items in one atomic update"""
+    new_items = [CartItem(id=str(uuid.uuid4()), **item.dict()).dict() for item in patch.add]
+    cart = await _change_items(user_id, new_items=new_items, remove_ids=patch.remove)
     
-    return CartResponse(items=items, total=total)
+    return _cart_response(cart)
 
 @router.get("/", response_model=CartResponse)
-async def get_cart(authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
-    
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    cart = await db.carts.find_one({"user_id": user_id})
-    
-    if not cart:
-        return CartResponse(items=[], total=0)
-    
-    items = [CartItem(**item) for item in cart['items']]
-    total = sum(item.total_price for item in items)
-    
-    return CartResponse(items=items, total=total)
+async def get_cart(user_id: str = Depends(get_current_user_id)):
+    cart = await db.carts.find_one({"user_id": user_id}, CART_PROJECTION)
+    return _cart_response(cart)
+
+@router.get("/count", response_model=CartCount)
+async def get_cart_count(user_id: str = Depends(get_current_user_id)):
+    """Badge figures only; the items array is never loaded"""
+    cart = await db.carts.find_one({"user_id": user_id}, {"_id": 0, "total": 1, "item_count": 1})
+    
+    # A cart without the projected fields comes back as {}, not None
+    if cart is None:
+        return CartCount(item_count=0, total=0)
+    
+    if 'item_count' not in cart:
+        # Not backfilled yet (see utils.backfills); count from the items
+        cart = await db.carts.find_one({"user_id": user_id}, {"_id": 0, "items.total_price": 1}) or {}
+        items = cart.get('items', [])
+        return CartCount(item_count=len(items), total=sum(item['total_price'] for item in items))
+    
+    return CartCount(item_count=cart['item_count'], total=cart.get('total', 0))
 
 @router.delete("/{item_id}", response_model=CartResponse)
-async def remove_from_cart(item_id: str, authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
-    
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    # Remove item from cart
-    await db.carts.update_one(
-        {"user_id": user_id},
-        {
-            "$pull": {"items": {"id": item_id}},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-    )
-    
-    cart = await db.carts.find_one({"user_id": user_id})
-    
-    if not cart:
-        return CartResponse(items=[], total=0)
-    
-    items = [CartItem(**item) for item in cart['items']]
-    total = sum(item.total_price for item in items)
-    
-    return CartResponse(items=items, total=total)
+async def remove_from_cart(item_id: str, user_id: str = Depends(get_current_user_id)):
+    cart = await _change_items(user_id, remove_ids=[item_id])
+    return _cart_response(cart)
 
 @router.delete("/")
-async def clear_cart(authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
-    
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
+async def clear_cart(user_id: str = Depends(get_current_user_id)):
     await db.carts.update_one(
         {"user_id": user_id},
-        {"$set": {"items": [], "updated_at": datetime.utcnow()}}
+        {"$set": {**EMPTY_CART, "updated_at": datetime.utcnow()}}
     )
     
     return {"message": "سبد خرید خالی شد"}
\ No newline at end of file
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException, Header, Depends
+from fastapi import APIRouter, HTTPException, Depends
 from database import db
-from utils.auth import decode_access_token
+from utils.dependencies import get_current_user_id, verify_admin
 from models.coupon import (
     CouponCreate, CouponUpdate, CouponResponse,
     CouponValidateRequest, CouponValidateResponse, CouponUsage
@@ -11,44 +11,6 @@ import uuid
 
 router = APIRouter(prefix="/coupons", tags=["coupons"])
 
-# Admin check
-async def verify_admin(authorization: str = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(status_code=401, detail="توکن نامعتبر است")
-    
-    user_id = payload.get("sub")
-    user = await db.users.find_one({"id": user_id})
-    
-    if not user or not user.get('is_admin', False):
-        raise HTTPException(status_code=403, detail="دسترسی محدود به ادمین")
-    
-    return user_id
-
-# User authentication
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        raise HTTPException(status_code=401, detail="توکن نامعتبر است")
-    
-    user_id = payload.get("sub")
-    user = await db.users.find_one({"id": user_id})
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="کاربر پیدا نشد")
-    
-    return user_id
-
 # Admin endpoints
 @router.post("/admin", response_model=CouponResponse, status_code=201)
 async def create_coupon(
@@ -156,7 +118,7 @@ async def delete_coupon(
 @router.post("/validate", response_model=CouponValidateResponse)
 async def validate_coupon(
     request: CouponValidateRequest,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user_id)
 ):
     """اعتبارسنجی کد تخفیف"""
     coupon = await db.coupons.find_one({"code": request.code.upper()})
@@ -244,7 +206,7 @@ async def apply_coupon(
     coupon_id: str,
     order_id: str,
     discount_amount: float,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user_id)
 ):
     """ثبت استفاده از کد تخفیف"""
     # بررسی وجود کوپن
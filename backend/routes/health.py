@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+import asyncio
+import logging
+import os
+from database import db, MONGO_MAX_POOL_SIZE
+from utils.dependencies import verify_admin
+from utils.pool_metrics import pool_metrics
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+# Budget (seconds) for the readiness ping; well under the load balancer's
+# probe interval so a stuck pool marks the worker unready instead of hanging.
+HEALTH_PING_TIMEOUT = float(os.environ.get('HEALTH_PING_TIMEOUT', '0.5'))
+
+NO_STORE = {"Cache-Control": "no-store"}
+
+def _unready(reason: str, pool: dict) -> JSONResponse:
+    # Probes are anonymous, so the reason and pool figures go to the log only
+    logger.warning("Readiness check failed: %s (pool %s)", reason, pool)
+    return JSONResponse(status_code=503, content={"status": "unavailable"}, headers=NO_STORE)
+
+@router.get("/live")
+async def liveness():
+    return JSONResponse({"status": "ok"}, headers=NO_STORE)
+
+@router.get("/ready")
+async def readiness():
+    """503 when the database does not answer a ping within HEALTH_PING_TIMEOUT.
+    
+    A saturated pool shows up as the ping waiting for a connection and
+    timing out. The pool counters are not compared with MONGO_MAX_POOL_SIZE:
+    they add up every server of a replica set, while the limit is per server.
+    """
+    pool = pool_metrics.snapshot()
+    
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=HEALTH_PING_TIMEOUT)
+    except asyncio.TimeoutError:
+        return _unready("database ping timed out", pool)
+    except Exception as e:
+        return _unready(f"database ping failed: {type(e).__name__}", pool)
+    
+    return JSONResponse({"status": "ready"}, headers=NO_STORE)
+
+@router.get("/pool")
+async def pool_stats(admin_id: str = Depends(verify_admin)):
+    """Connection pool counters for this worker"""
+    return JSONResponse({**pool_metrics.snapshot(), "max_pool_size": MONGO_MAX_POOL_SIZE}, headers=NO_STORE)
\ No newline at end of file
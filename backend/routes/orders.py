@@ -1,30 +1,48 @@
-from fastapi import APIRouter, HTTPException, Header
-from models.order import OrderCreate, OrderResponse, Order, OrderItem
-from utils.auth import decode_access_token
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from pymongo import ReturnDocument
+from models.order import OrderCreate, OrderResponse, OrderPage, OrderSummary, OrderSummaryPage, Order, OrderItem
+from utils.dependencies import get_current_user_id
+from utils.responses import model_projection, trusted_response
+from utils.pagination import KEYSET_SORT, keyset_page
+from utils.idempotency import IdempotencyConflict, claim_key, complete_key, release_key
+from routes.cart import EMPTY_CART
+from typing import List, Optional, Union
+from datetime import datetime
+import uuid
 from database import db
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
-async def get_user_from_token(authorization: str):
-    if not authorization or not authorization.startswith("Bearer "):
-        return None
-    
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    
-    if not payload:
-        return None
-    
-    return payload.get("sub")
+ORDER_PROJECTION = model_projection(OrderResponse)
+
+# List rows for ?view=summary; items, notes and file details are never read
+ORDER_SUMMARY_PROJECTION = model_projection(OrderSummary)
+
+# Page size when a client asks for cursor pages without giving a limit
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+async def fill_item_counts(orders: List[dict]) -> List[dict]:
+    """Set item_count on orders stored before it was (see utils.backfills).
+    Summary rows carry no items, so their counts are read in one query."""
+    missing = [order for order in orders if 'item_count' not in order]
+    if not missing:
+        return orders
+    
+    counts = {}
+    unloaded = [order['id'] for order in missing if 'items' not in order]
+    if unloaded:
+        async for order in db.orders.find({"id": {"$in": unloaded}}, {"_id": 0, "id": 1, "items.pages": 1}):
+            counts[order['id']] = len(order.get('items', []))
+    
+    for order in missing:
+        order['item_count'] = len(order['items']) if 'items' in order else counts.get(order['id'], 0)
+    return orders
 
 @router.post("/", response_model=OrderResponse)
-async def create_order(order_data: OrderCreate, authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
-    
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
+async def create_order(order_data: OrderCreate, user_id: str = Depends(get_current_user_id)):
     # Calculate total
     total_amount = sum(item.total_price for item in order_data.items)
     
@@ -32,7 +50,8 @@ async def create_order(order_data: OrderCreate, authorization: str = Header(None
     order = Order(
         user_id=user_id,
         items=[OrderItem(**item.dict()) for item in order_data.items],
-        total_amount=total_amount
+        total_amount=total_amount,
+        item_count=len(order_data.items)
     )
     
     # Insert into database
@@ -41,22 +60,23 @@ async def create_order(order_data: OrderCreate, authorization: str = Header(None
     # Clear cart
     await db.carts.update_one(
         {"user_id": user_id},
-        {"$set": {"items": []}}
+        {"$set": EMPTY_CART}
     )
     
-    return OrderResponse(**order.dict())
+    return trusted_response(order.model_dump())
 
-@router.post("/checkout", response_model=OrderResponse)
-async def checkout_cart(authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
-    
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
-    # Get cart
-    cart = await db.carts.find_one({"user_id": user_id})
+async def _checkout(user_id: str, order_id: Optional[str] = None) -> Order:
+    # Claim the cart: empty it and get its previous items in one atomic
+    # step, so an item added concurrently either makes it into this order
+    # or stays in the cart, and two concurrent checkouts can't both win
+    cart = await db.carts.find_one_and_update(
+        {"user_id": user_id, "items.0": {"$exists": True}},
+        {"$set": {**EMPTY_CART, "updated_at": datetime.utcnow()}},
+        projection={"_id": 0, "items": 1},
+        return_document=ReturnDocument.BEFORE
+    )
     
-    if not cart or not cart.get('items'):
+    if not cart:
         raise HTTPException(status_code=400, detail="سبد خرید خالی است")
     
     # Calculate total
@@ -66,58 +86,107 @@ async def checkout_cart(authorization: str = Header(None)):
     order = Order(
         user_id=user_id,
         items=[OrderItem(**item) for item in cart['items']],
-        total_amount=total_amount
+        total_amount=total_amount,
+        item_count=len(cart['items'])
     )
-    
-    # Insert order
-    await db.orders.insert_one(order.dict())
-    
-    # Clear cart
-    await db.carts.update_one(
-        {"user_id": user_id},
-        {"$set": {"items": []}}
-    )
-    
-    return OrderResponse(**order.dict())
+    if order_id:
+        order.id = order_id
+    
+    try:
+        await db.orders.insert_one(order.dict())
+    except Exception:
+        # Put the claimed items back so a failed checkout loses nothing
+        await db.carts.update_one(
+            {"user_id": user_id},
+            {
+                "$push": {"items": {"$each": cart['items']}},
+                "$inc": {"total": total_amount, "item_count": len(cart['items'])}
+            }
+        )
+        raise
+    
+    return order
 
-@router.get("/", response_model=List[OrderResponse])
-async def get_orders(status: Optional[str] = None, authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
-    
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
+@router.post("/checkout", response_model=OrderResponse)
+async def checkout_cart(
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, max_length=MAX_IDEMPOTENCY_KEY_LENGTH)
+):
+    """Turn the cart into an order. Retries that repeat the request's
+    ``Idempotency-Key`` get the original order back instead of a new one."""
+    if not idempotency_key:
+        order = await _checkout(user_id)
+        return trusted_response(order.model_dump())
+    
+    try:
+        record = await claim_key(user_id, "checkout", idempotency_key, str(uuid.uuid4()))
+    except IdempotencyConflict:
+        raise HTTPException(status_code=409, detail="درخواست مشابه در حال پردازش است")
+    
+    order = await db.orders.find_one({"id": record['result_id'], "user_id": user_id}, ORDER_PROJECTION)
+    
+    if record['status'] == 'pending':
+        if order is None:
+            try:
+                created = await _checkout(user_id, order_id=record['result_id'])
+            except BaseException:
+                await release_key(user_id, "checkout", idempotency_key)
+                raise
+            
+            await complete_key(user_id, "checkout", idempotency_key)
+            return trusted_response(created.model_dump())
+        
+        # Taken over from an attempt that inserted the order but died before
+        # it could complete the key
+        await complete_key(user_id, "checkout", idempotency_key)
+    elif order is None:
+        raise HTTPException(status_code=404, detail="سفارش پیدا نشد")
     
+    await fill_item_counts([order])
+    return trusted_response(order, headers={"Idempotent-Replayed": "true"})
+
+@router.get("/", response_model=Union[List[OrderResponse], OrderPage, List[OrderSummary], OrderSummaryPage])
+async def get_orders(
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    view: str = Query("full", pattern="^(full|summary)$"),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Without ``cursor``/``limit`` returns a plain list as before; with
+    either, returns one page and the ``next_cursor`` to continue from.
+    ``view=summary`` returns OrderSummary rows instead of full orders."""
     # Build query
     query = {"user_id": user_id}
     if status and status != 'all':
         query['status'] = status
     
-    # Get orders
-    orders = await db.orders.find(query).sort("created_at", -1).to_list(1000)
+    projection = ORDER_SUMMARY_PROJECTION if view == "summary" else ORDER_PROJECTION
     
-    return [OrderResponse(**order) for order in orders]
-
-@router.get("/{order_id}", response_model=OrderResponse)
-async def get_order(order_id: str, authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
+    if cursor is None and limit is None:
+        orders = await db.orders.find(query, projection).sort(KEYSET_SORT).to_list(MAX_PAGE_SIZE)
+        return trusted_response(await fill_item_counts(orders))
     
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
+    try:
+        orders, next_cursor = await keyset_page(db.orders, query, projection, limit or DEFAULT_PAGE_SIZE, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="نشانگر صفحه نامعتبر است")
     
-    order = await db.orders.find_one({"id": order_id, "user_id": user_id})
+    await fill_item_counts(orders)
+    return trusted_response({"orders": orders, "next_cursor": next_cursor})
+
+@router.get("/{order_id}", response_model=OrderResponse)
+async def get_order(order_id: str, user_id: str = Depends(get_current_user_id)):
+    order = await db.orders.find_one({"id": order_id, "user_id": user_id}, ORDER_PROJECTION)
     
     if not order:
         raise HTTPException(status_code=404, detail="سفارش پیدا نشد")
     
-    return OrderResponse(**order)
+    await fill_item_counts([order])
+    return trusted_response(order)
 
 @router.delete("/{order_id}")
-async def delete_order(order_id: str, authorization: str = Header(None)):
-    user_id = await get_user_from_token(authorization)
-    
-    if not user_id:
-        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
-    
+async def delete_order(order_id: str, user_id: str = Depends(get_current_user_id)):
     result = await db.orders.delete_one({"id": order_id, "user_id": user_id})
     
     if result.deleted_count == 0:
@@ -1,55 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from database import db
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import os
+from utils.pricing_engine import pricing_engine
 
 router = APIRouter(prefix="/pricing", tags=["pricing"])
 
-async def get_pricing_from_db():
-    """Get pricing configuration from database, fallback to hardcoded if not found"""
-    pricing_doc = await db.pricing_config.find_one({"id": "pricing_config"})
-    
-    if not pricing_doc:
-        # Initialize from hardcoded values
-        from utils.pricing import paper_sizes, color_classes, print_types, services, pricing_tiers
-        pricing_data = {
-            "id": "pricing_config",
-            "paper_sizes": paper_sizes,
-            "color_classes": color_classes,
-            "print_types": print_types,
-            "services": services,
-            "pricing_tiers": pricing_tiers
-        }
-        await db.pricing_config.insert_one(pricing_data)
-        return pricing_data
-    
-    return pricing_doc
+# Cache-Control for the public catalog and price matrix; browsers and the
+# reverse proxy revalidate with If-None-Match once max-age has passed.
+PRICING_MAX_AGE = int(os.environ.get('PRICING_MAX_AGE', '60'))
+PRICING_STALE_WHILE_REVALIDATE = int(os.environ.get('PRICING_STALE_WHILE_REVALIDATE', '300'))
 
-def calculate_price_from_config(pricing_tiers: dict, color_class_id: str, print_type: str, total_pages: int) -> float:
-    tiers = pricing_tiers.get(color_class_id)
-    if not tiers:
-        return 0
-    
-    for tier in tiers:
-        if tier['min'] <= total_pages <= tier['max']:
-            return tier.get(print_type, 0)
-    
-    return 0
+# Upper bound on the number of quotes in one /calculate/batch request
+MAX_BATCH_ITEMS = 10000
 
-def get_service_cost_from_config(services: list, service_id: str, pages: int) -> float:
-    service = next((s for s in services if s['id'] == service_id), None)
-    if not service:
-        return 0
-    
-    if 'min_pages' in service and pages < service['min_pages']:
-        return 0
-    
-    return service['price']
+# Upper bounds on a single quote; their product keeps the sheet count well
+# inside the int64 arithmetic of the vectorized batch path
+MAX_QUOTE_PAGES = 100000
+MAX_QUOTE_COPIES = 10000
 
 class PriceCalculationRequest(BaseModel):
     color_class: str
     print_type: str
-    pages: int
-    copies: int
+    pages: int = Field(..., ge=0, le=MAX_QUOTE_PAGES)
+    copies: int = Field(..., ge=0, le=MAX_QUOTE_COPIES)
     service: str = 'none'
 
 class PriceCalculationResponse(BaseModel):
@@ -60,63 +35,76 @@ class PriceCalculationResponse(BaseModel):
     service_cost: float     # هزینه خدمات
     total: float           # قیمت نهایی
 
+class PriceBatchRequest(BaseModel):
+    items: List[PriceCalculationRequest] = Field(..., max_length=MAX_BATCH_ITEMS)
+
+class PriceBatchResponse(BaseModel):
+    results: List[PriceCalculationResponse]
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+def _cacheable_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": (
+            f"public, max-age={PRICING_MAX_AGE}, "
+            f"stale-while-revalidate={PRICING_STALE_WHILE_REVALIDATE}"
+        )
+    }
+    
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/")
-async def get_pricing_data():
-    pricing_config = await get_pricing_from_db()
-    pricing_config.pop('_id', None)
+async def get_pricing_data(if_none_match: Optional[str] = Header(None)):
+    snapshot = await pricing_engine.snapshot()
+    return _cacheable_response(snapshot.catalog, snapshot.catalog_etag, if_none_match)
+
+@router.get("/matrix")
+async def get_price_matrix(
+    known_hash: Optional[str] = Query(None, alias="hash"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Compiled price grid; pass the last seen ``hash`` to get 304 if unchanged"""
+    snapshot = await pricing_engine.snapshot()
+    etag = f'"{snapshot.matrix["hash"]}"'
     
-    return {
-        "paper_sizes": pricing_config.get('paper_sizes'),
-        "color_classes": pricing_config.get('color_classes'),
-        "print_types": pricing_config.get('print_types'),
-        "services": pricing_config.get('services')
-    }
+    if known_hash is not None and known_hash == snapshot.matrix['hash']:
+        if_none_match = etag
+    
+    return _cacheable_response(snapshot.matrix_body, etag, if_none_match)
 
 @router.post("/calculate", response_model=PriceCalculationResponse)
 async def calculate_pricing(request: PriceCalculationRequest):
-    pricing_config = await get_pricing_from_db()
-    
-    # محاسبه تعداد برگ بر اساس نوع چاپ
-    # تک‌رو: هر صفحه = یک برگ
-    # دورو: هر دو صفحه = یک برگ
-    if request.print_type == 'double':
-        # چاپ دورو: تعداد صفحات تقسیم بر 2 (با رند به سمت بالا)
-        import math
-        sheets_per_copy = math.ceil(request.pages / 2)
-    else:
-        # چاپ تک‌رو: تعداد صفحات = تعداد برگ
-        sheets_per_copy = request.pages
-    
-    # تعداد کل برگ برای همه نسخه‌ها
-    total_sheets = sheets_per_copy * request.copies
-    
-    # قیمت هر برگ بر اساس تعداد کل برگ و تعرفه
-    # CRITICAL FIX: Use 'single' price for all sheet-based calculations
-    price_per_sheet = calculate_price_from_config(
-        pricing_config.get('pricing_tiers', {}),
+    quote = await pricing_engine.quote(
         request.color_class,
-        'single',  # Always use single price for sheet-based pricing
-        total_sheets
+        request.print_type,
+        request.pages,
+        request.copies,
+        request.service
     )
-    
-    # قیمت هر نسخه = تعداد برگ در هر نسخه × قیمت هر برگ
-    price_per_copy = sheets_per_copy * price_per_sheet
-    
-    # هزینه خدمات (بر اساس تعداد صفحات)
-    service_cost = get_service_cost_from_config(
-        pricing_config.get('services', []),
-        request.service,
-        request.pages
+    return PriceCalculationResponse(**quote)
+
+@router.post("/calculate/batch", response_model=PriceBatchResponse)
+async def calculate_pricing_batch(request: PriceBatchRequest):
+    """Quote many items in one call, evaluated column-wise with NumPy"""
+    items = request.items
+    results = await pricing_engine.quote_batch(
+        [item.color_class for item in items],
+        [item.print_type for item in items],
+        [item.pages for item in items],
+        [item.copies for item in items],
+        [item.service for item in items]
     )
     
-    # قیمت نهایی
-    total = (price_per_copy * request.copies) + service_cost
-    
-    return PriceCalculationResponse(
-        price_per_sheet=price_per_sheet,
-        sheets_per_copy=sheets_per_copy,
-        total_sheets=total_sheets,
-        price_per_copy=price_per_copy,
-        service_cost=service_cost,
-        total=total
-    )
\ No newline at end of file
+    # Values come straight from the price table with the response types
+    # already, so skip re-validating thousands of response models
+    return JSONResponse({"results": results})
\ No newline at end of file
@@ -1,4 +1,6 @@
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -7,10 +9,13 @@ from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List
 import uuid
+import time
 from datetime import datetime, timezone
 
 # Import database
-from database import db
+from database import db, client
+from utils.indexes import ensure_indexes
+from utils.pricing_engine import pricing_engine
 
 # Import routes
 from routes.auth import router as auth_router
@@ -18,15 +23,79 @@ from routes.pricing import router as pricing_router
 from routes.cart import router as cart_router
 from routes.orders import router as orders_router
 from routes.admin import router as admin_router
+from routes.pricing_admin import router as pricing_admin_router
 from routes.addresses import router as addresses_router
 from routes.coupons import router as coupons_router
+from routes.health import router as health_router
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def _open_pool():
+    # The client connects lazily; a ping forces server selection and the
+    # first pooled connection, and fails startup if MongoDB is unreachable
+    await db.command("ping")
+
+async def _load_pricing():
+    snapshot = await pricing_engine.snapshot()
+    return f"version {snapshot.version}"
+
+async def _ensure_indexes():
+    result = await ensure_indexes(db)
+    return f"{len(result['created'])} created, {len(result['failed'])} failed"
+
+async def _self_test_quote():
+    return f"{await pricing_engine.self_test()} quotes checked"
+
+# (name, step, required), run in order; indexes come before pricing so a
+# first-time seed of pricing_config is already covered by its unique index.
+# Only a failing required step aborts startup; the others are warm-ups, and
+# bad data behind them (e.g. one broken pricing_config document) is logged
+# rather than stopping every worker from booting. Data backfills are not
+# startup steps; they run once from utils.backfills.
+STARTUP_STEPS = [
+    ("open_pool", _open_pool, True),
+    ("ensure_indexes", _ensure_indexes, True),
+    ("load_pricing", _load_pricing, False),
+    ("self_test_quote", _self_test_quote, False),
+]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the worker before it accepts traffic; a failing required step aborts startup"""
+    timings = {}
+    started = time.perf_counter()
+    
+    for name, step, required in STARTUP_STEPS:
+        step_started = time.perf_counter()
+        try:
+            detail = await step()
+        except Exception:
+            if required:
+                raise
+            logger.exception("Startup step %s failed; continuing without it", name)
+            detail = "failed"
+        timings[name] = round((time.perf_counter() - step_started) * 1000, 1)
+        logger.info("Startup step %s done in %.1f ms%s", name, timings[name], f" ({detail})" if detail else "")
+    
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    app.state.startup_timings = timings
+    logger.info("Startup finished in %.1f ms", timings["total"])
+    
+    yield
+    
+    client.close()
+
 # Create the main app without a prefix
-app = FastAPI(title="TopCopy Printing API")
+app = FastAPI(title="TopCopy Printing API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -78,8 +147,10 @@ api_router.include_router(pricing_router)
 api_router.include_router(cart_router)
 api_router.include_router(orders_router)
 api_router.include_router(admin_router)
+api_router.include_router(pricing_admin_router)
 api_router.include_router(addresses_router)
 api_router.include_router(coupons_router)
+api_router.include_router(health_router)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -90,16 +161,4 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
-)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    from database import client
-    client.close()
\ No newline at end of file
+)
\ No newline at end of file
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Order listing serialization benchmark
+
+Compares the cost of turning stored orders into a response body on the
+previous path (validate every document into OrderResponse, then
+jsonable_encoder + json.dumps) and on the trusted-read path (projected
+documents straight to orjson), then times GET /api/orders and
+GET /api/admin/orders end to end through an in-process ASGI client with the
+database replaced by a stub.
+
+Usage (from backend/):
+    python tests/bench_orders.py --output bench_orders.json
+    python tests/bench_orders.py --baseline bench_orders.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# database.py reads these at import time; the stubs below replace the client
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'bench')
+
+import httpx
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models.order import OrderResponse
+from tests.bench_pricing import bench_async, bench_sync, compare
+
+class StubCursor:
+    def __init__(self, docs: List[dict]):
+        self.docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def skip(self, count: int):
+        self.docs = self.docs[count:]
+        return self
+
+    def limit(self, count: int):
+        self.docs = self.docs[:count] if count else self.docs
+        return self
+
+    async def to_list(self, length):
+        # Fresh top-level dicts, as the driver would return
+        return [dict(doc) for doc in self.docs[:length]]
+
+class StubCollection:
+    """Serves a fixed list of documents; filters and projections are ignored"""
+
+    def __init__(self, docs: List[dict]):
+        self.docs = docs
+        self.by_id = {doc['id']: doc for doc in docs}
+
+    def find(self, query=None, projection=None):
+        return StubCursor(self.docs)
+
+    async def find_one(self, query=None, projection=None):
+        doc = self.by_id.get((query or {}).get('id'))
+        return dict(doc) if doc else None
+
+    async def count_documents(self, query=None):
+        return len(self.docs)
+
+class StubDB:
+    def __init__(self, orders: List[dict], users: List[dict]):
+        self.orders = StubCollection(orders)
+        self.users = StubCollection(users)
+
+def make_orders(count: int, items_per_order: int, users: int, seed: int = 42) -> List[dict]:
+    rng = random.Random(seed)
+    created = datetime(2025, 1, 1)
+    orders = []
+    for i in range(count):
+        items = []
+        for _ in range(items_per_order):
+            pages, copies = rng.randint(1, 500), rng.randint(1, 10)
+            price = rng.choice([450, 900, 1500, 3200])
+            items.append({
+                "paper_size": "a4",
+                "color_class": rng.choice(["a4_bw_simple", "a4_color_80"]),
+                "print_type": rng.choice(["single", "double"]),
+                "pages": pages,
+                "copies": copies,
+                "service": "none",
+                "price_per_copy": float(price * pages),
+                "service_cost": 0.0,
+                "total_price": float(price * pages * copies),
+                "notes": None,
+                "file_method": "upload",
+                "file_details": None
+            })
+        orders.append({
+            "id": f"order-{i}",
+            "user_id": f"user-{i % users}",
+            "items": items,
+            "total_amount": sum(item['total_price'] for item in items),
+            "status": rng.choice(["pending", "processing", "completed"]),
+            "created_at": created + timedelta(minutes=i),
+            "updated_at": created + timedelta(minutes=i)
+        })
+    return orders
+
+def run_micro(orders: List[dict], iterations: int, warmup: int) -> Dict[str, dict]:
+    adapter = TypeAdapter(List[OrderResponse])
+
+    def validated_orders():
+        # Previous GET /api/orders: OrderResponse(**order) per document, then
+        # response_model validation and jsonable_encoder in FastAPI
+        content = [OrderResponse(**order) for order in orders]
+        content = adapter.validate_python([order.model_dump() for order in content])
+        json.dumps(jsonable_encoder(content), ensure_ascii=False).encode('utf-8')
+
+    def encoded_admin_orders():
+        # Previous GET /api/admin/orders: no response_model, but the dict
+        # still went through jsonable_encoder before JSONResponse
+        json.dumps(jsonable_encoder({"orders": orders}), ensure_ascii=False).encode('utf-8')
+
+    def trusted_orders():
+        orjson.dumps(orders)
+    
+    results = {}
+    for name, fn in [
+        ("serialize_orders_validated", validated_orders),
+        ("serialize_admin_orders_encoded", encoded_admin_orders),
+        ("serialize_orders_trusted", trusted_orders),
+    ]:
+        results[name] = bench_sync(fn, iterations, warmup, len(orders))
+    return results
+
+async def run_endpoints(orders: List[dict], users: List[dict], iterations: int, warmup: int) -> Dict[str, dict]:
+    import routes.admin
+    import routes.orders
+    from server import app
+    from utils.dependencies import get_current_user_id, verify_admin
+    
+    # server.py configures INFO logging; keep httpx from logging every request
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    stub = StubDB(orders, users)
+    routes.orders.db = stub
+    routes.admin.db = stub
+    app.dependency_overrides[get_current_user_id] = lambda: "user-0"
+    app.dependency_overrides[verify_admin] = lambda: "admin"
+    
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, url in [
+            ("get_orders", "/api/orders/"),
+            ("get_admin_orders", f"/api/admin/orders?limit={len(orders)}"),
+        ]:
+            async def call():
+                response = await client.get(url)
+                response.raise_for_status()
+            
+            results[name] = await bench_async(call, iterations, warmup, len(orders))
+    
+    app.dependency_overrides.clear()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200, help="orders per response")
+    parser.add_argument("--items", type=int, default=5, help="items per order")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per benchmark")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previously saved JSON file")
+    args = parser.parse_args()
+    
+    orders = make_orders(args.orders, args.items, users=max(1, args.orders // 10))
+    users = [{"id": f"user-{i}", "name": f"user {i}", "phone": f"0912{i:07d}"} for i in range(max(1, args.orders // 10))]
+    warmup = max(1, args.iterations // 10)
+    
+    benchmarks = run_micro(orders, args.iterations, warmup)
+    benchmarks.update(asyncio.run(run_endpoints(orders, users, args.iterations, warmup)))
+    
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "orders_per_response": args.orders,
+        "items_per_order": args.items,
+        "benchmarks": benchmarks
+    }
+    
+    for name, figures in benchmarks.items():
+        print(f"{name:35} {figures['ops_per_sec']:>12,.1f} orders/s  p50 {figures['p50_us']:>10,.2f}us  p99 {figures['p99_us']:>10,.2f}us")
+    
+    validated = benchmarks["serialize_orders_validated"]["p50_us"]
+    trusted = benchmarks["serialize_orders_trusted"]["p50_us"]
+    print(f"\ntrusted-read serialization is {validated / trusted:,.1f}x faster than the validated path (p50)")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(benchmarks, json.load(f)["benchmarks"])
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Pricing benchmark suite
+
+Measures the quote path at three levels and writes the figures as JSON so
+runs can be compared against a saved baseline:
+
+1. micro-benchmarks of tier lookup, service lookup and batch evaluation
+2. /api/pricing/calculate and /api/pricing/calculate/batch through an
+   in-process ASGI client, with the database replaced by a stub
+3. ops/s and p50/p99 latency for every case
+
+Usage (from backend/):
+    python tests/bench_pricing.py --output bench.json
+    python tests/bench_pricing.py --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# database.py reads these at import time; the stub below replaces the client
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'bench')
+
+import httpx
+
+from utils.pricing import (
+    build_price_table, calculate_price_from_config, compile_pricing_tiers,
+    compile_services, get_service_cost_from_config, pricing_tiers, services
+)
+from utils.pricing_engine import QuoteCache, default_pricing_data, pricing_engine
+
+class StubCollection:
+    """Serves one in-memory document; enough for the pricing read path"""
+
+    def __init__(self, doc: Optional[dict] = None):
+        self.doc = doc
+
+    async def find_one(self, query=None, projection=None):
+        return dict(self.doc) if self.doc else None
+
+    async def insert_one(self, doc):
+        self.doc = dict(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        pass
+
+class StubDB:
+    def __init__(self):
+        self.pricing_config = StubCollection({**default_pricing_data(), "version": 0})
+        self.pricing_logs = StubCollection()
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(latencies_ns: List[int], ops_per_call: int = 1) -> Dict[str, float]:
+    latencies_us = sorted(ns / 1000 for ns in latencies_ns)
+    total_s = sum(latencies_ns) / 1e9
+    return {
+        "iterations": len(latencies_us),
+        "ops_per_call": ops_per_call,
+        "ops_per_sec": round(len(latencies_us) * ops_per_call / total_s, 1) if total_s else 0.0,
+        "mean_us": round(statistics.fmean(latencies_us), 3),
+        "p50_us": round(percentile(latencies_us, 0.50), 3),
+        "p99_us": round(percentile(latencies_us, 0.99), 3)
+    }
+
+def bench_sync(fn: Callable[[], object], iterations: int, warmup: int, ops_per_call: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    
+    latencies = []
+    clock = time.perf_counter_ns
+    for _ in range(iterations):
+        start = clock()
+        fn()
+        latencies.append(clock() - start)
+    
+    return summarize(latencies, ops_per_call)
+
+async def bench_async(fn: Callable[[], object], iterations: int, warmup: int, ops_per_call: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        await fn()
+    
+    latencies = []
+    clock = time.perf_counter_ns
+    for _ in range(iterations):
+        start = clock()
+        await fn()
+        latencies.append(clock() - start)
+    
+    return summarize(latencies, ops_per_call)
+
+def random_requests(count: int, seed: int = 42) -> List[dict]:
+    rng = random.Random(seed)
+    color_class_ids = list(pricing_tiers)
+    service_ids = [service['id'] for service in services]
+    return [
+        {
+            "color_class": rng.choice(color_class_ids),
+            "print_type": rng.choice(['single', 'double']),
+            "pages": rng.randint(1, 1500),
+            "copies": rng.randint(1, 20),
+            "service": rng.choice(service_ids)
+        }
+        for _ in range(count)
+    ]
+
+def run_micro(iterations: int, warmup: int) -> Dict[str, dict]:
+    compiled = compile_pricing_tiers(pricing_tiers)
+    services_by_id = compile_services(services)
+    table = build_price_table(compiled, services_by_id)
+    requests = random_requests(1000)
+    cycle = iter(requests * (iterations + warmup))
+
+    def tier_lookup():
+        item = next(cycle)
+        calculate_price_from_config(compiled, item['color_class'], 'single', item['pages'] * item['copies'])
+
+    def service_lookup():
+        item = next(cycle)
+        get_service_cost_from_config(services_by_id, item['service'], item['pages'])
+    
+    columns = [[item[key] for item in requests] for key in ('color_class', 'print_type', 'pages', 'copies', 'service')]
+
+    def batch_quote():
+        table.quote(*columns)
+    
+    results = {
+        "calculate_price_from_config": bench_sync(tier_lookup, iterations, warmup),
+        "get_service_cost_from_config": bench_sync(service_lookup, iterations, warmup)
+    }
+    results["price_table_quote_1000"] = bench_sync(batch_quote, max(1, iterations // 100), warmup // 100, len(requests))
+    return results
+
+async def run_endpoints(iterations: int, warmup: int) -> Dict[str, dict]:
+    from server import app
+    
+    # server.py configures INFO logging; keep httpx from logging every request
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    pricing_engine.db = StubDB()
+    pricing_engine.invalidate()
+    requests = random_requests(1000)
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        hot = requests[0]
+
+        async def calculate_hot():
+            response = await client.post("/api/pricing/calculate", json=hot)
+            response.raise_for_status()
+        
+        results["calculate_pricing_cached"] = await bench_async(calculate_hot, iterations, warmup)
+        
+        # Same request with memoization off, so every call is evaluated
+        cache = pricing_engine.quote_cache
+        pricing_engine.quote_cache = QuoteCache(0)
+        try:
+            results["calculate_pricing_uncached"] = await bench_async(calculate_hot, iterations, warmup)
+        finally:
+            pricing_engine.quote_cache = cache
+        
+        batch = {"items": requests}
+
+        async def calculate_batch():
+            response = await client.post("/api/pricing/calculate/batch", json=batch)
+            response.raise_for_status()
+        
+        results["calculate_pricing_batch_1000"] = await bench_async(
+            calculate_batch, max(1, iterations // 100), max(1, warmup // 100), len(requests)
+        )
+    
+    return results
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict]):
+    print(f"\n{'benchmark':35} {'baseline ops/s':>15} {'current ops/s':>15} {'change':>8}")
+    for name, figures in current.items():
+        before = baseline.get(name)
+        if not before or not before.get('ops_per_sec'):
+            print(f"{name:35} {'-':>15} {figures['ops_per_sec']:>15,.1f} {'new':>8}")
+            continue
+        change = (figures['ops_per_sec'] / before['ops_per_sec'] - 1) * 100
+        print(f"{name:35} {before['ops_per_sec']:>15,.1f} {figures['ops_per_sec']:>15,.1f} {change:>+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000, help="timed calls per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=2000, help="timed HTTP calls per endpoint benchmark")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previously saved JSON file")
+    args = parser.parse_args()
+    
+    benchmarks = run_micro(args.iterations, args.iterations // 10)
+    benchmarks.update(asyncio.run(run_endpoints(args.requests, args.requests // 10)))
+    
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": benchmarks
+    }
+    
+    for name, figures in benchmarks.items():
+        print(f"{name:35} {figures['ops_per_sec']:>12,.1f} ops/s  p50 {figures['p50_us']:>10,.2f}us  p99 {figures['p99_us']:>10,.2f}us")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(benchmarks, json.load(f)["benchmarks"])
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Shared fixtures: the app runs in-process against an in-memory mongomock
+database, so the tests need no MongoDB server.
+
+Usage (from backend/):
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# database.py reads these at import time; its client is replaced below
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test')
+
+from mongomock_motor import AsyncMongoMockClient
+
+import database
+
+# Every module binds `from database import db` when it is imported, so the
+# mock has to be in place before the app is
+database.client = AsyncMongoMockClient()
+database.db = database.client[os.environ['DB_NAME']]
+
+from fastapi.testclient import TestClient
+
+from server import app
+from utils.auth import create_access_token
+from utils.dependencies import token_cache, token_epochs, user_cache
+from utils.pricing_engine import pricing_engine
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def _drop_collections(db):
+    for name in await db.list_collection_names():
+        await db.drop_collection(name)
+
+@pytest.fixture
+def db():
+    run(_drop_collections(database.db))
+    return database.db
+
+@pytest.fixture
+def client(db):
+    # Per-process caches would otherwise carry state from the previous test
+    token_cache.clear()
+    user_cache.clear()
+    token_epochs._loaded_at = float('-inf')
+    pricing_engine.invalidate()
+    pricing_engine._index_ready = False
+    
+    # Entering the client runs the lifespan, which creates the indexes
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def make_user(db):
+    """Insert a user and return the Authorization header of a token for it"""
+    def make(user_id: str = "user-1", admin: bool = False) -> dict:
+        run(db.users.insert_one({
+            "id": user_id,
+            "phone": user_id,
+            "name": user_id,
+            "password": "-",
+            "is_admin": admin,
+            "created_at": datetime.utcnow()
+        }))
+        token = create_access_token({"sub": user_id, "phone": user_id}, role="admin" if admin else "user")
+        return {"Authorization": f"Bearer {token}"}
+    return make
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from conftest import run
+from utils.auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
+from utils.dependencies import token_epochs
+
+def bearer(user_id, role="user", epoch=0):
+    token = create_access_token({"sub": user_id, "phone": user_id}, role=role, epoch=epoch)
+    return {"Authorization": f"Bearer {token}"}
+
+def test_logout_all_revokes_earlier_tokens(client, make_user):
+    headers = make_user()
+    other_device = bearer("user-1")
+    
+    assert client.post("/api/auth/logout-all", headers=headers).status_code == 200
+    
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+    assert client.get("/api/auth/me", headers=other_device).status_code == 401
+    assert client.get("/api/auth/me", headers=bearer("user-1", epoch=1)).status_code == 200
+
+def test_a_role_change_revokes_the_users_tokens(client, make_user):
+    admin = make_user("admin-1", admin=True)
+    headers = make_user()
+    
+    response = client.put("/api/admin/users/user-1/role", headers=admin, json={"is_admin": True})
+    
+    assert response.status_code == 200
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+def test_a_demoted_admin_is_refused(client, make_user, db):
+    admin = make_user("admin-1", admin=True)
+    demoted = make_user("admin-2", admin=True)
+    assert client.get("/api/admin/pricing/cache", headers=demoted).status_code == 200
+    
+    client.put("/api/admin/users/admin-2/role", headers=admin, json={"is_admin": False})
+    
+    # The old token is revoked, and a new one carries the user role
+    assert client.get("/api/admin/pricing/cache", headers=demoted).status_code == 401
+    assert client.get("/api/admin/pricing/cache", headers=bearer("admin-2", epoch=1)).status_code == 403
+    # An admin claim is not enough once the user record is no longer an admin
+    assert client.get("/api/admin/pricing/cache", headers=bearer("admin-2", role="admin", epoch=1)).status_code == 403
+
+def test_epoch_table_holds_only_bumps_within_the_token_lifetime(client, db):
+    now = datetime.utcnow()
+    run(db.users.insert_many([
+        {"id": "recent", "phone": "recent", "token_epoch": 2, "token_epoch_at": now - timedelta(days=1)},
+        {"id": "expired", "phone": "expired", "token_epoch": 5, "token_epoch_at": now - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES + 1)}
+    ]))
+    token_epochs._loaded_at = float('-inf')
+    
+    assert run(token_epochs.get("recent")) == 2
+    assert run(token_epochs.get("expired")) == 0
+    assert set(token_epochs._epochs) == {"recent"}
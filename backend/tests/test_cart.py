@@ -0,0 +1,69 @@
+from conftest import run
+
+def cart_item(total_price: float) -> dict:
+    return {
+        "paper_size": "a4",
+        "color_class": "a4_bw_simple",
+        "print_type": "single",
+        "pages": 1,
+        "copies": 1,
+        "price_per_copy": total_price,
+        "service_cost": 0,
+        "total_price": total_price
+    }
+
+def test_total_and_item_count_follow_every_change(client, make_user):
+    headers = make_user()
+    
+    cart = client.post("/api/cart/", headers=headers, json=cart_item(10)).json()
+    assert (cart["total"], cart["item_count"]) == (10, 1)
+    
+    cart = client.post("/api/cart/", headers=headers, json=cart_item(20)).json()
+    assert (cart["total"], cart["item_count"]) == (30, 2)
+    first, second = (item["id"] for item in cart["items"])
+    
+    cart = client.patch("/api/cart/items", headers=headers, json={"add": [cart_item(5), cart_item(7)], "remove": [first]}).json()
+    assert (cart["total"], cart["item_count"]) == (32, 3)
+    
+    cart = client.delete(f"/api/cart/{second}", headers=headers).json()
+    assert (cart["total"], cart["item_count"]) == (12, 2)
+    
+    # Removing an item that is not there changes nothing
+    cart = client.delete("/api/cart/missing", headers=headers).json()
+    assert (cart["total"], cart["item_count"]) == (12, 2)
+    
+    assert client.get("/api/cart/count", headers=headers).json() == {"item_count": 2, "total": 12}
+    
+    client.delete("/api/cart/", headers=headers)
+    assert client.get("/api/cart/count", headers=headers).json() == {"item_count": 0, "total": 0}
+
+def test_removing_from_a_missing_cart_does_not_create_one(client, make_user, db):
+    headers = make_user()
+    
+    cart = client.delete("/api/cart/missing", headers=headers).json()
+    
+    assert cart == {"items": [], "total": 0, "item_count": 0}
+    assert run(db.carts.count_documents({})) == 0
+
+def test_adds_share_one_cart_and_remove_takes_out_one_item(client, make_user, db):
+    headers = make_user()
+    
+    client.post("/api/cart/", headers=headers, json=cart_item(10))
+    cart = client.post("/api/cart/", headers=headers, json=cart_item(20)).json()
+    first, second = (item["id"] for item in cart["items"])
+    
+    cart = client.delete(f"/api/cart/{first}", headers=headers).json()
+    
+    assert [item["id"] for item in cart["items"]] == [second]
+    assert run(db.carts.count_documents({"user_id": "user-1"})) == 1
+
+def test_cart_stored_without_totals(client, make_user, db):
+    headers = make_user()
+    run(db.carts.insert_one({"user_id": "user-1", "items": [{**cart_item(8), "id": "old"}]}))
+    
+    assert client.get("/api/cart/count", headers=headers).json() == {"item_count": 1, "total": 8}
+    assert client.get("/api/cart/", headers=headers).json()["total"] == 8
+    
+    # The next change recomputes the totals instead of starting them from zero
+    cart = client.post("/api/cart/", headers=headers, json=cart_item(2)).json()
+    assert (cart["total"], cart["item_count"]) == (10, 2)
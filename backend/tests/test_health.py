@@ -0,0 +1,28 @@
+from utils.pool_metrics import pool_metrics
+
+def test_ready_while_the_process_wide_pool_total_exceeds_the_per_server_limit(client, monkeypatch):
+    # in_use adds up every server of a replica set, so it can pass
+    # MONGO_MAX_POOL_SIZE while the primary still has free connections
+    monkeypatch.setattr(pool_metrics, "in_use", 150)
+    monkeypatch.setattr(pool_metrics, "waiting", 3)
+    
+    response = client.get("/api/health/ready")
+    
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+def test_unready_hides_the_reason_from_anonymous_callers(client, monkeypatch):
+    async def timeout(*args, **kwargs):
+        raise TimeoutError()
+    
+    monkeypatch.setattr("routes.health.db.command", timeout)
+    
+    response = client.get("/api/health/ready")
+    
+    assert response.status_code == 503
+    assert response.json() == {"status": "unavailable"}
+
+def test_pool_figures_need_an_admin(client, make_user):
+    assert client.get("/api/health/pool").status_code == 401
+    assert client.get("/api/health/pool", headers=make_user()).status_code == 403
+    assert "max_pool_size" in client.get("/api/health/pool", headers=make_user("admin-1", admin=True)).json()
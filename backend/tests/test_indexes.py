@@ -0,0 +1,42 @@
+from bson import ObjectId
+from fastapi.testclient import TestClient
+import pytest
+
+from conftest import run
+from server import app
+from test_cart import cart_item
+from utils.backfills import dedupe_carts
+from utils.indexes import RequiredIndexError, ensure_indexes
+
+def test_duplicate_carts_block_startup_until_deduped(db):
+    first, second = ObjectId(), ObjectId()
+    run(db.carts.insert_many([
+        {"_id": first, "user_id": "user-1", "items": [{**cart_item(10), "id": "a"}]},
+        {"_id": second, "user_id": "user-1", "items": [{**cart_item(20), "id": "b"}, {**cart_item(10), "id": "a"}]},
+        {"user_id": "user-2", "items": []}
+    ]))
+    
+    with pytest.raises(RequiredIndexError, match="carts.user_id_1"):
+        with TestClient(app):
+            pass
+    
+    assert run(dedupe_carts(db)) == 1
+    assert run(dedupe_carts(db)) == 0
+    
+    cart = run(db.carts.find_one({"user_id": "user-1"}))
+    assert cart["_id"] == first
+    assert [item["id"] for item in cart["items"]] == ["a", "b"]
+    assert (cart["total"], cart["item_count"]) == (30, 2)
+    
+    with TestClient(app):
+        pass
+
+@pytest.mark.parametrize("collection, keys, options, difference", [
+    ("carts", [("user_id", 1)], {}, "unique=False"),
+    ("idempotency_keys", [("created_at", 1)], {"expireAfterSeconds": 60}, "expireAfterSeconds=60"),
+])
+def test_a_required_index_with_other_options_is_rejected(db, collection, keys, options, difference):
+    run(db[collection].create_index(keys, **options))
+    
+    with pytest.raises(RequiredIndexError, match=difference):
+        run(ensure_indexes(db))
@@ -0,0 +1,184 @@
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import run
+from routes.admin import ORDER_EXPORT_COLUMNS
+from test_cart import cart_item
+from utils.pagination import after_cursor, decode_cursor, encode_cursor
+
+def make_orders(db, statuses, user_id="user-1"):
+    created = datetime(2025, 1, 1)
+    run(db.orders.insert_many([
+        {
+            "id": f"order-{i}",
+            "user_id": user_id,
+            "items": [],
+            "total_amount": 0,
+            "item_count": 0,
+            "status": status,
+            # Pairs of orders share a created_at, so id has to break the tie
+            "created_at": created + timedelta(minutes=i // 2),
+            "updated_at": created
+        }
+        for i, status in enumerate(statuses)
+    ]))
+
+def test_cursor_round_trip():
+    doc = {"created_at": datetime(2025, 3, 1, 12, 30, 15, 123000), "id": "order-7"}
+    
+    assert decode_cursor(encode_cursor(doc)) == (doc["created_at"], "order-7")
+    assert after_cursor({"user_id": "u"}, None) == {"user_id": "u"}
+    assert after_cursor({"user_id": "u"}, encode_cursor(doc))["$or"] == [
+        {"created_at": {"$lt": doc["created_at"]}},
+        {"created_at": doc["created_at"], "id": {"$lt": "order-7"}}
+    ]
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "bnVsbA", "WzEsMiwzXQ"])
+def test_decode_cursor_rejects_foreign_tokens(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_cursor_pages_cover_every_order_once(client, make_user, db):
+    headers = make_user()
+    make_orders(db, ["pending"] * 7)
+    
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/orders/", headers=headers, params=params).json()
+        seen += [order["id"] for order in page["orders"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert seen == [f"order-{i}" for i in (6, 5, 4, 3, 2, 1, 0)]
+
+def test_bad_cursor_is_a_400(client, make_user):
+    headers = make_user("admin-1", admin=True)
+    
+    assert client.get("/api/orders/", headers=headers, params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/api/admin/orders", headers=headers, params={"cursor": "garbage"}).status_code == 400
+
+def test_bulk_status_follows_the_state_machine(client, make_user, db):
+    headers = make_user("admin-1", admin=True)
+    make_orders(db, ["pending", "processing", "completed", "cancelled"])
+    
+    response = client.post("/api/admin/orders/status", headers=headers, json={
+        "order_ids": ["order-0", "order-1", "order-2", "order-3", "order-0", "missing"],
+        "status": "completed"
+    })
+    
+    assert response.status_code == 200
+    assert response.json()["updated"] == 2
+    assert [(r["order_id"], r["result"]) for r in response.json()["results"]] == [
+        ("order-0", "updated"),
+        ("order-1", "updated"),
+        ("order-2", "unchanged"),
+        ("order-3", "invalid_transition"),
+        ("missing", "not_found")
+    ]
+    
+    order = run(db.orders.find_one({"id": "order-0"}))
+    assert order["status"] == "completed"
+    assert "completed" in order["status_timestamps"]
+    assert order["status_history"][-1]["from"] == "pending"
+    assert order["status_history"][-1]["by"] == "admin-1"
+
+def test_single_status_update_rejects_final_states(client, make_user, db):
+    headers = make_user("admin-1", admin=True)
+    make_orders(db, ["completed"])
+    
+    assert client.put("/api/admin/orders/order-0/status", headers=headers, json={"status": "pending"}).status_code == 400
+    assert client.put("/api/admin/orders/order-0/status", headers=headers, json={"status": "shipped"}).status_code == 422
+    assert client.put("/api/admin/orders/missing/status", headers=headers, json={"status": "completed"}).status_code == 404
+
+def test_status_endpoints_need_an_admin(client, make_user, db):
+    headers = make_user()
+    make_orders(db, ["pending"])
+    
+    response = client.post("/api/admin/orders/status", headers=headers, json={"order_ids": ["order-0"], "status": "completed"})
+    assert response.status_code == 403
+
+def test_checkout_replays_the_order_for_a_repeated_key(client, make_user, db):
+    headers = make_user()
+    client.post("/api/cart/", headers=headers, json=cart_item(10))
+    keyed = {**headers, "Idempotency-Key": "checkout-1"}
+    
+    first = client.post("/api/orders/checkout", headers=keyed)
+    replay = client.post("/api/orders/checkout", headers=keyed)
+    
+    assert first.status_code == replay.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json()["id"] == first.json()["id"]
+    assert run(db.orders.count_documents({})) == 1
+    
+    # A new key is a new checkout, and the cart is empty by now
+    assert client.post("/api/orders/checkout", headers={**headers, "Idempotency-Key": "checkout-2"}).status_code == 400
+
+def test_checkout_retry_after_a_lost_completion_does_not_duplicate(client, make_user, db, monkeypatch):
+    import routes.orders
+    
+    headers = make_user()
+    client.post("/api/cart/", headers=headers, json=cart_item(10))
+    keyed = {**headers, "Idempotency-Key": "checkout-1"}
+
+    async def lost(*args):
+        raise ConnectionError("connection dropped")
+    
+    # The order is inserted, but marking the key completed fails
+    with monkeypatch.context() as patch:
+        patch.setattr(routes.orders, "complete_key", lost)
+        with pytest.raises(ConnectionError):
+            client.post("/api/orders/checkout", headers=keyed)
+    
+    # Still pending: a retry is told to wait
+    assert client.post("/api/orders/checkout", headers=keyed).status_code == 409
+    
+    run(db.idempotency_keys.update_one({"key": "checkout-1"}, {"$set": {"created_at": datetime.utcnow() - timedelta(hours=1)}}))
+    retry = client.post("/api/orders/checkout", headers=keyed)
+    
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert run(db.orders.count_documents({})) == 1
+    assert run(db.idempotency_keys.find_one({"key": "checkout-1"}))["status"] == "completed"
+
+def test_csv_export_streams_filtered_rows_with_formulas_escaped(client, make_user, db):
+    headers = make_user("admin-1", admin=True)
+    make_user("user-1")
+    run(db.users.update_one({"id": "user-1"}, {"$set": {"name": '=HYPERLINK("x")'}}))
+    make_orders(db, ["pending", "completed", "pending", "pending", "pending"])
+    
+    response = client.get("/api/admin/orders/export", headers=headers, params={"format": "csv"})
+    
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.content.startswith("\ufeff".encode("utf-8"))
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert rows[0] == ORDER_EXPORT_COLUMNS
+    assert [row[0] for row in rows[1:]] == [f"order-{i}" for i in range(5)]
+    assert {row[5] for row in rows[1:]} == {'\'=HYPERLINK("x")'}
+    
+    # created_at of order-i is i // 2 minutes past midnight
+    response = client.get("/api/admin/orders/export", headers=headers, params={
+        "format": "csv",
+        "status": "pending",
+        "start_date": "2025-01-01T00:01:00",
+        "end_date": "2025-01-01T00:02:00"
+    })
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert rows[0] == ORDER_EXPORT_COLUMNS
+    assert [row[0] for row in rows[1:]] == ["order-2", "order-3"]
+
+def test_ndjson_export_streams_one_order_per_line(client, make_user, db):
+    headers = make_user("admin-1", admin=True)
+    make_orders(db, ["pending", "completed", "pending"])
+    
+    response = client.get("/api/admin/orders/export", headers=headers, params={"status": "pending"})
+    
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.content.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["order-0", "order-2"]
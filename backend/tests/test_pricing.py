@@ -0,0 +1,171 @@
+import itertools
+import math
+
+import mongomock
+import pytest
+
+from conftest import run
+from utils.pricing import PricingConfigError, compile_tiers
+from utils.pricing_engine import PricingSnapshot, QuoteCache, calculate_quote, default_pricing_data
+import utils.pricing_engine
+
+def tier(low, high, single=1000, double=1800):
+    return {"min": low, "max": high, "single": single, "double": double}
+
+def test_compile_tiers_sorts_and_looks_up_by_page_count():
+    compiled = compile_tiers("a4", [tier(100, 499, 800), tier(1, 99, 1000), tier(500, math.inf, 600)])
+    
+    assert compiled.mins == (1, 100, 500)
+    assert compiled.gaps == ()
+    assert compiled.lookup("single", 1) == 1000
+    assert compiled.lookup("single", 99) == 1000
+    assert compiled.lookup("single", 100) == 800
+    assert compiled.lookup("single", 10 ** 6) == 600
+
+def test_compile_tiers_rejects_overlap():
+    with pytest.raises(PricingConfigError, match="overlaps"):
+        compile_tiers("a4", [tier(1, 100), tier(100, 200)])
+    
+    # An inverted tier has no neighbour to overlap, so it is checked on its own
+    with pytest.raises(PricingConfigError, match="ends before it starts"):
+        compile_tiers("a4", [tier(400, 100)])
+    with pytest.raises(PricingConfigError, match="ends before it starts"):
+        compile_tiers("a4", [tier(1, 99), tier(400, 100), tier(500, 999)])
+
+def test_compile_tiers_records_gaps_and_prices_them_at_zero():
+    compiled = compile_tiers("a4", [tier(5, 99), tier(200, 999)])
+    
+    assert compiled.gaps == ((1, 4), (100, 199))
+    assert compiled.lookup("single", 3) == 0
+    assert compiled.lookup("single", 150) == 0
+    assert compiled.lookup("single", 1000) == 0
+    assert compiled.lookup("unknown", 50) == 0
+
+def test_price_table_matches_calculate_quote():
+    snapshot = PricingSnapshot.build({**default_pricing_data(), "version": 1})
+    service_ids = [service['id'] for service in snapshot.config['services']] + ['none', 'unknown']
+    cases = list(itertools.product(
+        list(snapshot.tiers) + ['unknown'],
+        ['single', 'double'],
+        [0, 1, 2, 3, 99, 100, 101, 499, 500, 999, 1000, 5000],
+        [0, 1, 3],
+        service_ids
+    ))
+    
+    batch = snapshot.table.quote(*zip(*cases))
+    
+    for i, case in enumerate(cases):
+        expected = calculate_quote(snapshot, *case)
+        for field, value in expected.items():
+            assert float(batch[field][i]) == pytest.approx(value), (case, field)
+
+def test_quote_cache_evicts_least_recently_used():
+    cache = QuoteCache(maxsize=2)
+    assert cache.get("a", 1) is None
+    cache.put("a", 1, {"total": 1})
+    cache.put("b", 1, {"total": 2})
+    
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a", 1) == {"total": 1}
+    cache.put("c", 1, {"total": 3})
+    
+    assert cache.get("b", 1) is None
+    assert cache.get("c", 1) == {"total": 3}
+    assert cache.stats() == {"version": 1, "size": 2, "maxsize": 2, "hits": 2, "misses": 2, "evictions": 1}
+
+def test_quote_cache_drops_everything_on_a_new_version():
+    cache = QuoteCache(maxsize=10)
+    cache.get("a", 1)
+    cache.put("a", 1, {"total": 1})
+    
+    assert cache.get("a", 2) is None
+    assert cache.stats()["size"] == 0
+    
+    # A result computed under the old version is never stored
+    cache.put("a", 1, {"total": 1})
+    assert cache.get("a", 2) is None
+    
+    cache.put("a", 2, {"total": 5})
+    cache.clear()
+    assert cache.get("a", 2) is None
+
+FULL_READ = {"_id": 0}
+VERSION_PROBE = {"_id": 0, "version": 1}
+
+def quote_request(pages=1, service="none"):
+    return {"color_class": "a4_bw_simple", "print_type": "single", "pages": pages, "copies": 1, "service": service}
+
+def test_batch_quote_matches_single_quotes_and_bounds_its_inputs(client):
+    items = [quote_request(pages) for pages in (1, 499, 500, 1000)]
+    
+    response = client.post("/api/pricing/calculate/batch", json={"items": items})
+    
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        client.post("/api/pricing/calculate", json=item).json() for item in items
+    ]
+    assert client.post("/api/pricing/calculate", json=quote_request(100001)).status_code == 422
+    assert client.post("/api/pricing/calculate/batch", json={"items": [{**quote_request(), "copies": 10001}]}).status_code == 422
+
+@pytest.fixture
+def config_reads(monkeypatch):
+    """Projections of every pricing_config.find_one the app makes"""
+    reads = []
+    find_one = mongomock.collection.Collection.find_one
+
+    def counted(self, filter=None, *args, **kwargs):
+        if self.name == "pricing_config":
+            reads.append(args[0] if args else kwargs.get("projection"))
+        return find_one(self, filter, *args, **kwargs)
+    
+    monkeypatch.setattr(mongomock.collection.Collection, "find_one", counted)
+    return reads
+
+def test_quotes_within_the_ttl_make_no_db_calls(client, config_reads):
+    # The lifespan warm-up has already loaded the snapshot
+    for pages in range(1, 21):
+        assert client.post("/api/pricing/calculate", json=quote_request(pages)).status_code == 200
+    
+    assert config_reads == []
+
+def test_a_stale_snapshot_only_probes_the_version(client, config_reads, monkeypatch):
+    monkeypatch.setattr(utils.pricing_engine, "PRICING_CACHE_TTL", 0)
+    
+    client.post("/api/pricing/calculate", json=quote_request())
+    
+    assert config_reads == [VERSION_PROBE]
+
+def test_a_version_bumped_elsewhere_is_reloaded_after_the_ttl(client, config_reads, db, monkeypatch):
+    # Another worker's edit: the stored version moves, this worker is not told
+    run(db.pricing_config.update_one(
+        {"id": "pricing_config"},
+        {"$set": {"pricing_tiers.a4_bw_simple.0.single": 2000}, "$inc": {"version": 1}}
+    ))
+    
+    assert client.post("/api/pricing/calculate", json=quote_request()).json()["total"] == 1190
+    assert config_reads == []
+    
+    monkeypatch.setattr(utils.pricing_engine, "PRICING_CACHE_TTL", 0)
+    assert client.post("/api/pricing/calculate", json=quote_request()).json()["total"] == 2000
+    assert config_reads == [VERSION_PROBE, FULL_READ]
+
+@pytest.mark.parametrize("method, path, body, quote, total", [
+    ("put", "/api/admin/pricing/tier/a4_bw_simple/0", {"min": 1, "max": 499, "single": 2000, "double": 2400}, quote_request(), 2000),
+    ("put", "/api/admin/pricing/service/hotglue", {"price": 100}, quote_request(service="hotglue"), 1290),
+    ("post", "/api/admin/pricing/initialize", None, quote_request(), 1190)
+])
+def test_an_admin_edit_reloads_on_the_next_quote(client, make_user, config_reads, db, method, path, body, quote, total):
+    headers = make_user("admin-1", admin=True)
+    version = run(db.pricing_config.find_one({"id": "pricing_config"}))["version"]
+    client.post("/api/pricing/calculate", json=quote)
+    
+    response = client.request(method, path, headers=headers, json=body)
+    assert response.status_code == 200
+    assert run(db.pricing_config.find_one({"id": "pricing_config"}))["version"] == version + 1
+    
+    config_reads.clear()
+    assert client.post("/api/pricing/calculate", json=quote).json()["total"] == total
+    assert client.post("/api/pricing/calculate", json=quote).json()["total"] == total
+    
+    # One full read, well inside the TTL, and no probe: the edit dropped the snapshot
+    assert config_reads == [FULL_READ]
@@ -1,7 +1,9 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
 import os
 
 # Password hashing
@@ -18,8 +20,41 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+# bcrypt takes hundreds of milliseconds per call, so the async handlers run it
+# on a small dedicated pool. Requests beyond the queue limit are refused
+# rather than piling up behind a login storm.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', '32'))
+
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_password_tasks = 0
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many hash/verify calls are already queued"""
+
+async def _run_password_task(fn, *args):
+    global _password_tasks
+    if _password_tasks >= PASSWORD_HASH_QUEUE_LIMIT:
+        raise PasswordHasherBusy()
+    
+    _password_tasks += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_password_executor, fn, *args)
+    finally:
+        _password_tasks -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_task(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, role: str = "user", epoch: int = 0):
+    """Sign a token; ``role`` and the user's token ``epoch`` ride along as
+    claims so admin checks and revocation need no user lookup"""
     to_encode = data.copy()
+    to_encode.update({"role": role, "epoch": epoch})
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
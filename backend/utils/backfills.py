@@ -0,0 +1,106 @@
+"""One-off backfills that bring documents written by older code in line
+with what newer code expects.
+
+``dedupe_carts`` must run before deploying the code that requires the
+unique ``carts.user_id`` index: carts duplicated by the old add-to-cart
+race keep that index from being built, and startup fails without it.
+
+The other backfills store fields that readers otherwise compute when they
+are missing, so they are not needed for correct answers; they only spare
+those readers the extra work.
+
+Each backfill scans the whole collection, so run it once around a deploy
+instead of from every worker at startup. Re-running is a no-op.
+
+Run from backend/:
+    python -m utils.backfills                # every backfill
+    python -m utils.backfills dedupe_carts   # only the named ones
+"""
+from datetime import datetime
+import argparse
+import asyncio
+
+async def dedupe_carts(database) -> int:
+    """Merge every user's extra carts into their oldest one; returns the
+    number of carts removed"""
+    duplicates = database.carts.aggregate([
+        {"$group": {"_id": "$user_id", "cart_ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ])
+    removed = 0
+    
+    async for group in duplicates:
+        # ObjectIds grow with insertion time, so the first is the oldest cart
+        carts = await database.carts.find({"_id": {"$in": group["cart_ids"]}}).sort("_id", 1).to_list(None)
+        keep, extra = carts[0], carts[1:]
+        
+        items, item_ids = [], set()
+        for cart in carts:
+            for item in cart.get("items") or []:
+                if item.get("id") not in item_ids:
+                    item_ids.add(item.get("id"))
+                    items.append(item)
+        
+        # Every write matches the items as they were read: a cart changed in
+        # the meantime is left alone, and the next run merges it
+        merged = await database.carts.update_one({"_id": keep["_id"], "items": keep.get("items")}, {"$set": {
+            "items": items,
+            "total": sum(item.get("total_price", 0) for item in items),
+            "item_count": len(items),
+            "updated_at": datetime.utcnow()
+        }})
+        if not merged.matched_count:
+            continue
+        
+        for cart in extra:
+            result = await database.carts.delete_one({"_id": cart["_id"], "items": cart.get("items")})
+            removed += result.deleted_count
+    
+    return removed
+
+async def backfill_cart_totals(database) -> int:
+    """Store total and item_count on carts written before they were
+    maintained; returns the number of carts updated"""
+    result = await database.carts.update_many(
+        {"item_count": {"$exists": False}},
+        [{"$set": {
+            "total": {"$sum": "$items.total_price"},
+            "item_count": {"$size": {"$ifNull": ["$items", []]}}
+        }}]
+    )
+    return result.modified_count
+
+async def backfill_order_item_counts(database) -> int:
+    """Store item_count on orders written before it was; returns the number
+    of orders updated"""
+    result = await database.orders.update_many(
+        {"item_count": {"$exists": False}},
+        [{"$set": {"item_count": {"$size": {"$ifNull": ["$items", []]}}}}]
+    )
+    return result.modified_count
+
+# Run in this order: cart_totals then sees the merged carts
+BACKFILLS = {
+    "dedupe_carts": dedupe_carts,
+    "cart_totals": backfill_cart_totals,
+    "order_item_counts": backfill_order_item_counts,
+}
+
+async def _main(args):
+    from database import client, db
+    
+    try:
+        for name in args.names:
+            print(f"{name}: {await BACKFILLS[name](db)} document(s) changed")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bring documents written by older code in line with the current code")
+    parser.add_argument("names", nargs="*", help=f"backfills to run: {', '.join(BACKFILLS)} (default: all)")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BACKFILLS]
+    if unknown:
+        parser.error(f"unknown backfill: {', '.join(unknown)}")
+    args.names = args.names or list(BACKFILLS)
+    asyncio.run(_main(args))
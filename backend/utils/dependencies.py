@@ -0,0 +1,178 @@
+from fastapi import Depends, Header, HTTPException
+from pymongo import ReturnDocument
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, Optional
+import asyncio
+import os
+import time
+from database import db
+from utils.auth import ACCESS_TOKEN_EXPIRE_MINUTES, decode_access_token
+
+# Seconds a decoded token or user record may be reused without a lookup.
+# Bounds how long a change made outside this process (e.g. is_admin set
+# directly in MongoDB) can go unnoticed.
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', '60'))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '10000'))
+
+# Seconds between reloads of the token epoch table; a revocation made by
+# another worker takes effect here within this window.
+AUTH_EPOCH_REFRESH = float(os.environ.get('AUTH_EPOCH_REFRESH', '30'))
+
+class TTLCache:
+    """Bounded LRU whose entries also expire after a time-to-live"""
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+# token -> decoded payload, user id -> user record (without password)
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+user_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+class TokenEpochs:
+    """In-memory copy of ``users.token_epoch`` for revocation checks.
+
+    A token is valid only while its ``epoch`` claim is at least the user's
+    current epoch. Once a bump is older than the token lifetime, every token
+    issued before it has expired and every live token carries the current
+    epoch, so only users bumped within that lifetime (``token_epoch_at``)
+    are stored. The table stays small however many users have ever logged
+    out everywhere, and reloading it is a single indexed query.
+    """
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._epochs: Dict[str, int] = {}
+        self._loaded_at = float('-inf')
+        self._lock = asyncio.Lock()
+    
+    async def _ensure_fresh(self):
+        if time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        
+        async with self._lock:
+            if time.monotonic() - self._loaded_at < self.refresh_interval:
+                return
+            bumped_after = datetime.utcnow() - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            users = db.users.find({"token_epoch_at": {"$gt": bumped_after}}, {"_id": 0, "id": 1, "token_epoch": 1})
+            self._epochs = {user['id']: user['token_epoch'] async for user in users}
+            self._loaded_at = time.monotonic()
+    
+    async def get(self, user_id: str) -> int:
+        await self._ensure_fresh()
+        return self._epochs.get(user_id, 0)
+    
+    async def bump(self, user_id: str) -> Optional[int]:
+        """Revoke every token issued to a user so far; returns the new epoch"""
+        user = await db.users.find_one_and_update(
+            {"id": user_id},
+            {"$inc": {"token_epoch": 1}, "$set": {"token_epoch_at": datetime.utcnow()}},
+            projection={"_id": 0, "id": 1, "token_epoch": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if user is None:
+            return None
+        
+        self._epochs[user_id] = user['token_epoch']
+        invalidate_user(user_id)
+        return user['token_epoch']
+
+token_epochs = TokenEpochs(AUTH_EPOCH_REFRESH)
+
+def invalidate_user(user_id: str):
+    """Forget a cached user record; call after changing a user document"""
+    user_cache.pop(user_id)
+
+def _decode_cached(token: str) -> Optional[dict]:
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    
+    payload = decode_access_token(token)
+    if payload:
+        # Never keep a token around past its own expiry
+        remaining = payload.get('exp', 0) - time.time()
+        token_cache.set(token, payload, ttl=remaining)
+    return payload
+
+async def _load_user(user_id: str) -> Optional[dict]:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    if user:
+        user_cache.set(user_id, user)
+    return user
+
+async def get_token_payload(authorization: str = Header(None)) -> dict:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="احراز هویت لازم است")
+    
+    token = authorization.replace("Bearer ", "")
+    payload = _decode_cached(token)
+    
+    if not payload or payload.get('epoch', 0) < await token_epochs.get(payload.get("sub")):
+        raise HTTPException(status_code=401, detail="توکن نامعتبر است")
+    
+    return payload
+
+# Authentication dependency
+async def get_current_user(payload: dict = Depends(get_token_payload)) -> dict:
+    user = await _load_user(payload.get("sub"))
+    
+    if not user:
+        raise HTTPException(status_code=404, detail="کاربر پیدا نشد")
+    
+    return user
+
+async def get_current_user_id(user: dict = Depends(get_current_user)) -> str:
+    return user['id']
+
+# Admin check
+async def verify_admin(
+    payload: dict = Depends(get_token_payload),
+    user: dict = Depends(get_current_user)
+) -> str:
+    """Require both an admin role claim (tokens issued before role claims
+    have none) and an admin user record that still exists.
+    
+    Revocation window: a demotion through PUT /admin/users/{id}/role bumps
+    the token epoch and applies at once on the worker that made it, and on
+    other workers within AUTH_EPOCH_REFRESH. A deleted account, or is_admin
+    changed directly in MongoDB, is noticed within AUTH_CACHE_TTL once the
+    cached user record expires.
+    """
+    if payload.get('role', 'admin') != 'admin' or not user.get('is_admin', False):
+        raise HTTPException(status_code=403, detail="دسترسی محدود به ادمین")
+    
+    return user['id']
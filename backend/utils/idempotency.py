@@ -0,0 +1,83 @@
+"""Idempotency keys for non-repeatable POSTs.
+
+A client sends an ``Idempotency-Key`` header; the first request with a key
+claims it and reserves the id its result (e.g. an order) will be stored
+under, and marks the key completed once the result exists. A retry with
+the same key then gets the original result back instead of repeating the
+side effect, even if the first request died between storing the result and
+completing the key. Keys are scoped per user
+and per operation and expire through a TTL index on ``created_at``.
+"""
+from datetime import datetime, timedelta
+import os
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+# Seconds a completed key is remembered; MongoDB's TTL monitor removes it
+# (within about a minute) after this
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', '86400'))
+
+# Seconds after which a key still marked pending is assumed to belong to a
+# request that died midway and may be taken over by a retry
+IDEMPOTENCY_PENDING_TIMEOUT = float(os.environ.get('IDEMPOTENCY_PENDING_TIMEOUT', '60'))
+
+class IdempotencyConflict(Exception):
+    """Another request with the same key is still being processed"""
+
+async def claim_key(user_id: str, scope: str, key: str, result_id: str) -> dict:
+    """Claim ``key`` for the caller, reserving ``result_id`` for its result.
+    
+    Returns the key's record. While its ``status`` is ``pending`` the caller
+    owns the key and must produce the result under the record's
+    ``result_id``: the one passed in, or the one reserved by an earlier
+    attempt that died midway and whose result may therefore already exist.
+    A ``completed`` record means the work was already done. Raises
+    IdempotencyConflict while another request holds the key.
+    """
+    now = datetime.utcnow()
+    record = {
+        "user_id": user_id, "scope": scope, "key": key,
+        "status": "pending", "result_id": result_id, "created_at": now
+    }
+    try:
+        await db.idempotency_keys.insert_one(dict(record))
+        return record
+    except DuplicateKeyError:
+        pass
+    
+    existing = await db.idempotency_keys.find_one({"user_id": user_id, "scope": scope, "key": key}, {"_id": 0})
+    if existing is None:
+        # Expired between the insert and the read; claim it afresh
+        return await claim_key(user_id, scope, key, result_id)
+    
+    if existing['status'] == 'completed':
+        return existing
+    
+    # Take over a pending key only if it is stale, and only one retry wins;
+    # the reserved result_id is kept
+    stale = await db.idempotency_keys.find_one_and_update(
+        {
+            "user_id": user_id, "scope": scope, "key": key, "status": "pending",
+            "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT)}
+        },
+        {"$set": {"created_at": now}},
+        return_document=ReturnDocument.AFTER
+    )
+    if stale is None:
+        raise IdempotencyConflict(key)
+    
+    stale.pop('_id', None)
+    return stale
+
+async def complete_key(user_id: str, scope: str, key: str):
+    await db.idempotency_keys.update_one(
+        {"user_id": user_id, "scope": scope, "key": key},
+        {"$set": {"status": "completed", "created_at": datetime.utcnow()}}
+    )
+
+async def release_key(user_id: str, scope: str, key: str):
+    """Forget a claimed key after the work failed, so it can be retried"""
+    await db.idempotency_keys.delete_one({"user_id": user_id, "scope": scope, "key": key, "status": "pending"})
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""Declarative registry of every MongoDB index the backend relies on.
+
+``ensure_indexes`` creates whatever is missing at startup; creating an index
+that already exists with the same keys and options is a no-op, so it is
+safe to run from every worker. Indexes marked ``required`` back a
+correctness guarantee (a unique constraint the code relies on to stay
+race-free), so startup fails if one cannot be created or exists with other
+options. ``index_report`` compares the registry with what the server
+actually has and, where ``$indexStats`` is available, flags indexes that
+have not served a query since the server started.
+
+Report from the command line (run from backend/):
+    python -m utils.indexes            # missing / undeclared / unused
+    python -m utils.indexes --apply    # create missing indexes, then report
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from utils.idempotency import IDEMPOTENCY_KEY_TTL
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+    sparse: bool = False
+    # TTL indexes: documents expire this many seconds after the indexed date
+    expire_after_seconds: Optional[int] = None
+    # Correctness, not just speed, depends on it; see RequiredIndexError
+    required: bool = False
+    # Why the index exists: the query it serves
+    purpose: str = field(default="", compare=False)
+
+    @property
+    def name(self) -> str:
+        # Same naming scheme as MongoDB's default, so indexes created
+        # elsewhere with create_index(...) are recognised as declared
+        return "_".join(f"{key}_{direction}" for key, direction in self.keys)
+
+    def model(self) -> IndexModel:
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.sparse:
+            options["sparse"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        return IndexModel(list(self.keys), **options)
+
+def _index(
+    collection: str,
+    *keys: Tuple[str, int],
+    unique: bool = False,
+    sparse: bool = False,
+    expire_after_seconds: Optional[int] = None,
+    required: bool = False,
+    purpose: str = ""
+) -> IndexSpec:
+    return IndexSpec(
+        collection, tuple(keys), unique=unique, sparse=sparse,
+        expire_after_seconds=expire_after_seconds, required=required, purpose=purpose
+    )
+
+class RequiredIndexError(RuntimeError):
+    """A required index is missing, could not be created, or exists with
+    options other than the declared ones"""
+
+def _option_differences(spec: IndexSpec, info: dict) -> List[str]:
+    """Options of an existing index (from ``index_information()``) that
+    differ from its spec"""
+    differences = []
+    unique = bool(info.get('unique', False))
+    if unique != spec.unique:
+        differences.append(f"unique={unique}, declared {spec.unique}")
+    expire_after_seconds = info.get('expireAfterSeconds')
+    if expire_after_seconds != spec.expire_after_seconds:
+        differences.append(f"expireAfterSeconds={expire_after_seconds}, declared {spec.expire_after_seconds}")
+    return differences
+
+INDEXES: List[IndexSpec] = [
+    # users
+    _index("users", ("id", ASCENDING), unique=True, purpose="user lookup on every authenticated request"),
+    _index("users", ("phone", ASCENDING), unique=True, purpose="login and duplicate check on register"),
+    _index("users", ("created_at", DESCENDING), ("id", DESCENDING), purpose="admin user list, keyset pages newest first"),
+    _index("users", ("token_epoch_at", ASCENDING), sparse=True, purpose="token epochs bumped within the token lifetime"),
+    
+    # orders
+    _index("orders", ("id", ASCENDING), unique=True, purpose="order by id"),
+    _index("orders", ("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING), purpose="a user's orders, keyset pages newest first"),
+    _index("orders", ("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING), purpose="admin status filter, status counts and keyset pages"),
+    _index("orders", ("created_at", DESCENDING), ("id", DESCENDING), purpose="admin order list keyset pages and dashboard date counts"),
+    
+    # carts: the code keeps exactly one cart per user; the upserting cart
+    # update relies on this index to turn a race into a DuplicateKeyError
+    _index("carts", ("user_id", ASCENDING), unique=True, required=True, purpose="cart of the current user"),
+    
+    # addresses
+    _index("addresses", ("id", ASCENDING), unique=True, purpose="address by id"),
+    _index("addresses", ("user_id", ASCENDING), purpose="addresses of the current user"),
+    
+    # coupons
+    _index("coupons", ("id", ASCENDING), unique=True, purpose="coupon by id"),
+    _index("coupons", ("code", ASCENDING), unique=True, purpose="coupon validation by code"),
+    _index("coupon_usages", ("coupon_id", ASCENDING), ("user_id", ASCENDING), purpose="per-user coupon usage count"),
+    
+    # idempotency keys: one per user, operation and key; expired by TTL.
+    # Without the unique index a repeated key would not be detected at all
+    _index("idempotency_keys", ("user_id", ASCENDING), ("scope", ASCENDING), ("key", ASCENDING), unique=True, required=True, purpose="claim and replay of Idempotency-Key"),
+    _index("idempotency_keys", ("created_at", ASCENDING), expire_after_seconds=IDEMPOTENCY_KEY_TTL, required=True, purpose="expire idempotency keys"),
+    
+    # pricing
+    _index("pricing_config", ("id", ASCENDING), unique=True, purpose="single pricing document"),
+    _index("pricing_logs", ("timestamp", DESCENDING), purpose="pricing change history"),
+]
+
+def indexes_by_collection(specs: List[IndexSpec] = INDEXES) -> Dict[str, List[IndexSpec]]:
+    grouped: Dict[str, List[IndexSpec]] = {}
+    for spec in specs:
+        grouped.setdefault(spec.collection, []).append(spec)
+    return grouped
+
+async def ensure_indexes(database, specs: List[IndexSpec] = INDEXES) -> Dict[str, List[str]]:
+    """Create every declared index that is missing.
+    
+    Returns ``{"created": [...], "failed": [...]}`` as ``collection.name``
+    strings. A failure (e.g. duplicate data under a unique index, or an
+    existing index with the same name but other options) is logged and does
+    not stop the remaining indexes from being created. Once all have been
+    tried, RequiredIndexError is raised if any of the failures was required.
+    
+    A required index is only accepted as present if its ``unique`` and
+    ``expireAfterSeconds`` match the spec: a non-unique ``user_id_1`` under
+    the right name would not enforce anything. Such an index has to be
+    dropped (or changed with ``collMod``) by hand.
+    """
+    result = {"created": [], "failed": []}
+    missing_required = []
+    
+    for collection, collection_specs in indexes_by_collection(specs).items():
+        existing = await database[collection].index_information()
+        for spec in collection_specs:
+            if spec.name in existing:
+                differences = _option_differences(spec, existing[spec.name]) if spec.required else []
+                if differences:
+                    logger.error("Index %s.%s exists with other options: %s", collection, spec.name, "; ".join(differences))
+                    result["failed"].append(f"{collection}.{spec.name}")
+                    missing_required.append(f"{collection}.{spec.name} ({'; '.join(differences)})")
+                continue
+            
+            try:
+                await database[collection].create_indexes([spec.model()])
+            except OperationFailure as e:
+                logger.error("Could not create index %s.%s: %s", collection, spec.name, e)
+                result["failed"].append(f"{collection}.{spec.name}")
+                if spec.required:
+                    missing_required.append(f"{collection}.{spec.name}")
+            else:
+                logger.info("Created index %s.%s", collection, spec.name)
+                result["created"].append(f"{collection}.{spec.name}")
+    
+    if missing_required:
+        raise RequiredIndexError(f"required index(es) missing or mismatched: {', '.join(missing_required)}")
+    
+    return result
+
+async def _index_usage(database, collection: str) -> Optional[Dict[str, int]]:
+    """Index name -> operations served since the server started, or None
+    when the deployment does not expose ``$indexStats``"""
+    try:
+        stats = await database[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+    except (OperationFailure, NotImplementedError):
+        return None
+    
+    usage: Dict[str, int] = {}
+    for stat in stats:
+        usage[stat['name']] = usage.get(stat['name'], 0) + int(stat.get('accesses', {}).get('ops', 0))
+    return usage
+
+async def index_report(database, specs: List[IndexSpec] = INDEXES) -> dict:
+    """Compare declared indexes with the ones that exist.
+    
+    - missing: declared but not present on the server
+    - undeclared: present but not in the registry (candidates for removal)
+    - unused: present but with zero recorded accesses; counters reset when
+      mongod restarts, so judge this on a server that has been up a while
+    """
+    grouped = indexes_by_collection(specs)
+    existing_collections = set(await database.list_collection_names())
+    report = {"missing": [], "undeclared": [], "unused": [], "usage_available": True}
+    
+    for collection in sorted(set(grouped) | existing_collections):
+        declared = {spec.name: spec for spec in grouped.get(collection, [])}
+        existing = await database[collection].index_information() if collection in existing_collections else {}
+        
+        for name, spec in declared.items():
+            if name not in existing:
+                report["missing"].append({"collection": collection, "name": name, "unique": spec.unique, "required": spec.required, "purpose": spec.purpose})
+        
+        for name in existing:
+            if name != "_id_" and name not in declared:
+                report["undeclared"].append({"collection": collection, "name": name})
+        
+        if not existing:
+            continue
+        
+        usage = await _index_usage(database, collection)
+        if usage is None:
+            report["usage_available"] = False
+            continue
+        
+        for name in existing:
+            if name != "_id_" and usage.get(name, 0) == 0:
+                report["unused"].append({"collection": collection, "name": name, "declared": name in declared})
+    
+    return report
+
+def _print_report(report: dict):
+    sections = [
+        ("Missing (declared, not on server)", report["missing"]),
+        ("Undeclared (on server, not in registry)", report["undeclared"]),
+        ("Unused since server start", report["unused"])
+    ]
+    for title, rows in sections:
+        print(f"{title}: {len(rows)}")
+        for row in rows:
+            print(f"  {row['collection']}.{row['name']}")
+    
+    if not report["usage_available"]:
+        print("Index usage statistics ($indexStats) are not available on this deployment")
+
+async def _main(args):
+    from database import client, db
+    
+    try:
+        if args.apply:
+            try:
+                result = await ensure_indexes(db)
+                print(f"Created {len(result['created'])} index(es), {len(result['failed'])} failed")
+            except RequiredIndexError as e:
+                print(e)
+        
+        report = await index_report(db)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            _print_report(report)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report missing or unused MongoDB indexes")
+    parser.add_argument("--apply", action="store_true", help="create missing indexes before reporting")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    asyncio.run(_main(parser.parse_args()))
\ No newline at end of file
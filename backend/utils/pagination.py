@@ -0,0 +1,54 @@
+"""Keyset (cursor) pagination over ``(created_at, id)``, newest first.
+
+A cursor is an opaque token holding the sort key of the last document on a
+page. The next page is a range query that starts just past it, so every
+page costs the same index seek however deep the client pages, unlike
+``skip`` which walks and discards every earlier document. ``id`` breaks
+ties between documents created in the same millisecond.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+import base64
+
+import orjson
+
+# Sort matching the (…, created_at -1, id -1) indexes in utils.indexes
+KEYSET_SORT = [("created_at", -1), ("id", -1)]
+
+def encode_cursor(doc: dict) -> str:
+    key = [doc['created_at'].isoformat(), doc['id']]
+    return base64.urlsafe_b64encode(orjson.dumps(key)).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises ValueError for a token that was not produced by encode_cursor"""
+    try:
+        created_at, doc_id = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except (TypeError, ValueError, orjson.JSONDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+def after_cursor(query: dict, cursor: Optional[str]) -> dict:
+    """``query`` restricted to documents that sort after ``cursor``"""
+    if not cursor:
+        return query
+    
+    created_at, doc_id = decode_cursor(cursor)
+    return {
+        **query,
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": doc_id}}
+        ]
+    }
+
+async def keyset_page(collection, query: dict, projection: dict, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of ``collection`` plus the cursor of the next page (None on
+    the last page). Reads one extra document to know whether more follow;
+    ``created_at`` and ``id`` must be included in ``projection``."""
+    docs = await collection.find(after_cursor(query, cursor), projection).sort(KEYSET_SORT).limit(limit + 1).to_list(limit + 1)
+    
+    if len(docs) <= limit:
+        return docs, None
+    
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1])
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Connection pool metrics collected from pymongo's pool event listener.
+
+The driver emits pool events from whichever thread runs the operation, so
+counters are guarded by a lock and checkout wait is timed per thread.
+Figures are per process and cover every server the client talks to.
+"""
+from pymongo import monitoring
+from typing import Dict
+import threading
+import time
+
+# Upper bounds (ms) of the checkout wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures: Dict[str, int] = {}
+            self.checkins = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.waiting = 0
+            self.open_connections = 0
+            self.pool_clears = 0
+            self.wait_ms_total = 0.0
+            self.wait_ms_max = 0.0
+            self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def _wait_finished(self) -> float:
+        started = getattr(self._local, 'checkout_started', None)
+        self._local.checkout_started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    # Checkout lifecycle
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_finished()
+        with self._lock:
+            self.waiting -= 1
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if wait_ms <= bound), len(WAIT_BUCKETS_MS))
+            self.wait_buckets[bucket] += 1
+
+    def connection_check_out_failed(self, event):
+        self._wait_finished()
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checkins += 1
+            self.in_use -= 1
+
+    # Connection and pool lifecycle
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)}
+            buckets["gt_%dms" % WAIT_BUCKETS_MS[-1]] = self.wait_buckets[-1]
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "checkins": self.checkins,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "waiting": self.waiting,
+                "open_connections": self.open_connections,
+                "pool_clears": self.pool_clears,
+                "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_ms_max, 3),
+                "wait_ms_buckets": buckets
+            }
+
+pool_metrics = PoolMetrics()
\ No newline at end of file
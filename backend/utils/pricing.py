@@ -1,3 +1,15 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Sequence, Tuple
+import hashlib
+import json
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
 # Pricing configuration
 
 paper_sizes = [
@@ -116,23 +128,251 @@ pricing_tiers = {
     ]
 }
 
-def calculate_price(color_class_id: str, print_type: str, total_pages: int) -> float:
-    tiers = pricing_tiers.get(color_class_id)
-    if not tiers:
+class PricingConfigError(ValueError):
+    """Raised when a tier table cannot be compiled (e.g. overlapping or inverted tiers)"""
+
+@dataclass(frozen=True)
+class CompiledTiers:
+    """Tiers of one color class as sorted boundary arrays.
+
+    ``mins``/``maxs`` hold the tier bounds in ascending order and ``prices``
+    maps each print type to a price array parallel to them.
+    """
+    mins: Tuple[float, ...]
+    maxs: Tuple[float, ...]
+    prices: Mapping[str, Tuple[float, ...]]
+    gaps: Tuple[Tuple[float, float], ...] = ()
+
+    def lookup(self, print_type: str, total_pages: int) -> float:
+        i = bisect_right(self.mins, total_pages) - 1
+        if i < 0 or total_pages > self.maxs[i]:
+            return 0
+        prices = self.prices.get(print_type)
+        if prices is None:
+            return 0
+        return prices[i]
+
+def compile_tiers(color_class_id: str, tiers: List[dict]) -> CompiledTiers:
+    ordered = sorted(tiers, key=lambda tier: tier['min'])
+    gaps = []
+    
+    for tier in ordered:
+        if tier['min'] > tier['max']:
+            raise PricingConfigError(
+                f"{color_class_id}: tier {tier['min']}-{tier['max']} ends before it starts"
+            )
+    
+    for prev, tier in zip(ordered, ordered[1:]):
+        if tier['min'] <= prev['max']:
+            raise PricingConfigError(
+                f"{color_class_id}: tier {tier['min']}-{tier['max']} overlaps "
+                f"tier {prev['min']}-{prev['max']}"
+            )
+        # Page counts are integers, so max=499 followed by min=500 is contiguous
+        if tier['min'] > prev['max'] + 1:
+            gaps.append((prev['max'] + 1, tier['min'] - 1))
+    
+    if ordered and ordered[0]['min'] > 1:
+        gaps.insert(0, (1, ordered[0]['min'] - 1))
+    
+    for low, high in gaps:
+        logger.warning("Pricing tiers for %s do not cover %s-%s pages", color_class_id, low, high)
+    
+    print_type_ids = {key for tier in ordered for key in tier if key not in ('min', 'max')}
+    
+    return CompiledTiers(
+        mins=tuple(tier['min'] for tier in ordered),
+        maxs=tuple(tier['max'] for tier in ordered),
+        prices={
+            print_type: tuple(tier.get(print_type, 0) for tier in ordered)
+            for print_type in print_type_ids
+        },
+        gaps=tuple(gaps)
+    )
+
+def compile_pricing_tiers(pricing_tiers: Mapping[str, List[dict]]) -> Dict[str, CompiledTiers]:
+    """Compile every color class; raises PricingConfigError on overlapping or inverted tiers"""
+    return {
+        color_class_id: compile_tiers(color_class_id, tiers)
+        for color_class_id, tiers in pricing_tiers.items()
+    }
+
+def compile_services(services: List[dict]) -> Dict[str, dict]:
+    return {service['id']: service for service in services}
+
+def service_cost(service: dict, pages: int) -> float:
+    if service.get('min_pages') is not None and pages < service['min_pages']:
         return 0
     
-    for tier in tiers:
-        if tier['min'] <= total_pages <= tier['max']:
-            return tier.get(print_type, 0)
+    return service['price']
+
+@dataclass(frozen=True)
+class PriceTable:
+    """All compiled tiers and services flattened into NumPy arrays.
+
+    Tier bounds of the color class with index ``c`` are shifted by
+    ``c * stride`` so a single ``searchsorted`` resolves the tier of every
+    item in a batch, whatever its color class.
+    """
+    class_index: Mapping[str, int]
+    service_index: Mapping[str, int]
+    stride: float
+    tier_class: np.ndarray
+    tier_min: np.ndarray
+    tier_max: np.ndarray
+    tier_prices: Mapping[str, np.ndarray]
+    service_prices: np.ndarray
+    service_min_pages: np.ndarray
+
+    def quote(
+        self,
+        color_class_ids: Sequence[str],
+        print_types: Sequence[str],
+        pages: Sequence[int],
+        copies: Sequence[int],
+        service_ids: Sequence[str]
+    ) -> Dict[str, np.ndarray]:
+        """Vectorized equivalent of POST /pricing/calculate for many items"""
+        class_idx = np.array([self.class_index.get(c, -1) for c in color_class_ids], dtype=np.int64)
+        service_idx = np.array([self.service_index.get(s, -1) for s in service_ids], dtype=np.int64)
+        is_double = np.array([p == 'double' for p in print_types], dtype=bool)
+        pages = np.asarray(pages, dtype=np.int64)
+        copies = np.asarray(copies, dtype=np.int64)
+        
+        # تک‌رو: هر صفحه = یک برگ، دورو: هر دو صفحه = یک برگ
+        sheets_per_copy = np.where(is_double, (pages + 1) // 2, pages)
+        total_sheets = sheets_per_copy * copies
+        
+        # Sheet-based pricing always uses the 'single' tier price
+        price_per_sheet = np.zeros(len(class_idx))
+        single = self.tier_prices.get('single')
+        if single is not None and len(single):
+            key = class_idx * self.stride + np.clip(total_sheets, 0, self.stride - 1)
+            tier = np.searchsorted(self.tier_min, key, side='right') - 1
+            safe_tier = np.clip(tier, 0, None)
+            in_tier = (
+                (class_idx >= 0)
+                & (tier >= 0)
+                & (self.tier_class[safe_tier] == class_idx)
+                & (key <= self.tier_max[safe_tier])
+            )
+            price_per_sheet = np.where(in_tier, single[safe_tier], 0.0)
+        
+        price_per_copy = sheets_per_copy * price_per_sheet
+        
+        service_cost = np.zeros(len(service_idx))
+        if len(self.service_prices):
+            safe_service = np.clip(service_idx, 0, None)
+            service_cost = np.where(
+                (service_idx >= 0) & (pages >= self.service_min_pages[safe_service]),
+                self.service_prices[safe_service],
+                0.0
+            )
+        
+        return {
+            "price_per_sheet": price_per_sheet,
+            "sheets_per_copy": sheets_per_copy,
+            "total_sheets": total_sheets,
+            "price_per_copy": price_per_copy,
+            "service_cost": service_cost,
+            "total": price_per_copy * copies + service_cost
+        }
+
+def build_price_table(compiled_tiers: Mapping[str, CompiledTiers], services_by_id: Mapping[str, dict]) -> PriceTable:
+    bounds = [
+        bound
+        for tiers in compiled_tiers.values()
+        for bound in tiers.mins + tiers.maxs
+        if math.isfinite(bound)
+    ]
+    stride = float(max(bounds, default=0)) + 2
+    
+    class_index = {}
+    tier_class, tier_min, tier_max = [], [], []
+    print_type_ids = {print_type for tiers in compiled_tiers.values() for print_type in tiers.prices}
+    tier_prices = {print_type: [] for print_type in print_type_ids}
+    
+    for i, (color_class_id, tiers) in enumerate(compiled_tiers.items()):
+        class_index[color_class_id] = i
+        offset = i * stride
+        tier_class.extend([i] * len(tiers.mins))
+        tier_min.extend(offset + bound for bound in tiers.mins)
+        tier_max.extend(offset + bound for bound in tiers.maxs)
+        for print_type, prices in tier_prices.items():
+            prices.extend(tiers.prices.get(print_type, (0,) * len(tiers.mins)))
+    
+    service_list = list(services_by_id.values())
     
-    return 0
+    return PriceTable(
+        class_index=class_index,
+        service_index={service['id']: i for i, service in enumerate(service_list)},
+        stride=stride,
+        tier_class=np.array(tier_class, dtype=np.int64),
+        tier_min=np.array(tier_min, dtype=np.float64),
+        tier_max=np.array(tier_max, dtype=np.float64),
+        tier_prices={
+            print_type: np.array(prices, dtype=np.float64)
+            for print_type, prices in tier_prices.items()
+        },
+        service_prices=np.array([service['price'] for service in service_list], dtype=np.float64),
+        service_min_pages=np.array(
+            [service.get('min_pages') or 0 for service in service_list], dtype=np.float64
+        )
+    )
 
-def get_service_cost(service_id: str, pages: int) -> float:
-    service = next((s for s in services if s['id'] == service_id), None)
-    if not service:
+def _json_bound(bound: float):
+    # JSON has no Infinity; an open-ended tier is published with max=null
+    return bound if math.isfinite(bound) else None
+
+def build_price_matrix(
+    color_classes: Mapping[str, List[dict]],
+    print_types: Mapping[str, List[dict]],
+    compiled_tiers: Mapping[str, CompiledTiers],
+    services_by_id: Mapping[str, dict]
+) -> dict:
+    """Full price grid for client-side quoting, tagged with a content hash.
+
+    Clients reproduce /pricing/calculate with it: sheets per copy is
+    ``ceil(pages / 2)`` for double-sided prints and ``pages`` otherwise, the
+    tier is picked by total sheets (``min <= sheets <= max``) and its
+    ``single`` price is charged per sheet.
+    """
+    grid = {}
+    for paper_size, classes in color_classes.items():
+        for color_class in classes:
+            tiers = compiled_tiers.get(color_class['id'])
+            grid[color_class['id']] = {
+                "paper_size": paper_size,
+                "type": color_class.get('type'),
+                "min": list(tiers.mins) if tiers else [],
+                "max": [_json_bound(bound) for bound in tiers.maxs] if tiers else [],
+                "prices": {
+                    print_type['id']: list(tiers.prices.get(print_type['id'], ())) if tiers else []
+                    for print_type in print_types.get(color_class.get('type'), [])
+                }
+            }
+    
+    matrix = {
+        "color_classes": grid,
+        "services": {
+            service_id: {"price": service['price'], "min_pages": service.get('min_pages')}
+            for service_id, service in services_by_id.items()
+        }
+    }
+    canonical = json.dumps(matrix, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    matrix["hash"] = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return matrix
+
+def calculate_price_from_config(compiled_tiers: Mapping[str, CompiledTiers], color_class_id: str, print_type: str, total_pages: int) -> float:
+    tiers = compiled_tiers.get(color_class_id)
+    if not tiers:
         return 0
     
-    if 'min_pages' in service and pages < service['min_pages']:
+    return tiers.lookup(print_type, total_pages)
+
+def get_service_cost_from_config(services_by_id: Mapping[str, dict], service_id: str, pages: int) -> float:
+    service = services_by_id.get(service_id)
+    if not service:
         return 0
     
-    return service['price']
\ No newline at end of file
+    return service_cost(service, pages)
@@ -0,0 +1,545 @@
+"""Single owner of pricing: loading, compiling, caching, evaluating and
+writing the ``pricing_config`` document.
+
+Every route reads prices through ``pricing_engine`` and every admin edit
+goes through one of its write methods, which bump the stored version and
+drop the cached snapshot.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from utils.indexes import ensure_indexes, indexes_by_collection
+from utils.pricing import (
+    CompiledTiers, PriceTable, PricingConfigError, build_price_matrix, build_price_table,
+    calculate_price_from_config, compile_pricing_tiers, compile_services,
+    compile_tiers, get_service_cost_from_config
+)
+
+# Seconds a worker may serve its in-memory pricing snapshot before it
+# re-checks the stored config version in MongoDB.
+PRICING_CACHE_TTL = float(os.environ.get('PRICING_CACHE_TTL', '30'))
+
+# Maximum number of memoized /pricing/calculate results per worker
+PRICING_QUOTE_CACHE_SIZE = int(os.environ.get('PRICING_QUOTE_CACHE_SIZE', '10000'))
+
+# Order items re-priced per NumPy pass by the what-if simulator; also the
+# cursor batch size, so memory stays flat however many orders there are.
+SIMULATION_BATCH_SIZE = int(os.environ.get('PRICING_SIMULATION_BATCH_SIZE', '5000'))
+
+CONFIG_ID = "pricing_config"
+
+def default_pricing_data() -> dict:
+    from utils.pricing import paper_sizes, color_classes, print_types, services, pricing_tiers
+    return {
+        "id": CONFIG_ID,
+        "paper_sizes": paper_sizes,
+        "color_classes": color_classes,
+        "print_types": print_types,
+        "services": services,
+        "pricing_tiers": pricing_tiers
+    }
+
+def dump_json(content) -> bytes:
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+@dataclass(frozen=True)
+class PricingSnapshot:
+    """Immutable view of the pricing_config document at a given version"""
+    version: int
+    config: Mapping
+    tiers: Dict[str, CompiledTiers]
+    services: Dict[str, dict]
+    table: PriceTable
+    matrix: dict
+    matrix_body: bytes
+    catalog: bytes
+    catalog_etag: str
+    loaded_at: float
+
+    @classmethod
+    def build(cls, pricing_doc: dict) -> "PricingSnapshot":
+        tiers = compile_pricing_tiers(pricing_doc.get('pricing_tiers', {}))
+        services = compile_services(pricing_doc.get('services', []))
+        version = pricing_doc.get('version', 0)
+        
+        # The public catalog is identical for every visitor, so serialize it once
+        catalog = dump_json({
+            "paper_sizes": pricing_doc.get('paper_sizes'),
+            "color_classes": pricing_doc.get('color_classes'),
+            "print_types": pricing_doc.get('print_types'),
+            "services": pricing_doc.get('services')
+        })
+        matrix = build_price_matrix(
+            pricing_doc.get('color_classes', {}),
+            pricing_doc.get('print_types', {}),
+            tiers,
+            services
+        )
+        
+        return cls(
+            version=version,
+            config=MappingProxyType(pricing_doc),
+            tiers=tiers,
+            services=services,
+            table=build_price_table(tiers, services),
+            matrix=matrix,
+            matrix_body=dump_json(matrix),
+            catalog=catalog,
+            catalog_etag=f'"v{version}-{hashlib.sha256(catalog).hexdigest()[:16]}"',
+            loaded_at=time.monotonic()
+        )
+
+def calculate_quote(
+    snapshot: PricingSnapshot,
+    color_class: str,
+    print_type: str,
+    pages: int,
+    copies: int,
+    service: str
+) -> dict:
+    # محاسبه تعداد برگ بر اساس نوع چاپ
+    # تک‌رو: هر صفحه = یک برگ
+    # دورو: هر دو صفحه = یک برگ
+    if print_type == 'double':
+        # چاپ دورو: تعداد صفحات تقسیم بر 2 (با رند به سمت بالا)
+        sheets_per_copy = math.ceil(pages / 2)
+    else:
+        # چاپ تک‌رو: تعداد صفحات = تعداد برگ
+        sheets_per_copy = pages
+    
+    # تعداد کل برگ برای همه نسخه‌ها
+    total_sheets = sheets_per_copy * copies
+    
+    # قیمت هر برگ بر اساس تعداد کل برگ و تعرفه
+    # CRITICAL FIX: Use 'single' price for all sheet-based calculations
+    price_per_sheet = calculate_price_from_config(
+        snapshot.tiers,
+        color_class,
+        'single',  # Always use single price for sheet-based pricing
+        total_sheets
+    )
+    
+    # قیمت هر نسخه = تعداد برگ در هر نسخه × قیمت هر برگ
+    price_per_copy = sheets_per_copy * price_per_sheet
+    
+    # هزینه خدمات (بر اساس تعداد صفحات)
+    service_cost = get_service_cost_from_config(snapshot.services, service, pages)
+    
+    # قیمت نهایی
+    total = (price_per_copy * copies) + service_cost
+    
+    return {
+        "price_per_sheet": price_per_sheet,
+        "sheets_per_copy": sheets_per_copy,
+        "total_sheets": total_sheets,
+        "price_per_copy": price_per_copy,
+        "service_cost": service_cost,
+        "total": total
+    }
+
+class QuoteCache:
+    """Bounded LRU of quote results for a single pricing version.
+
+    Keys carry the pricing version; results of an older version are never
+    returned, and the first lookup under a new version (or ``clear``)
+    drops every entry at once by swapping in an empty dict.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, dict]" = OrderedDict()
+    
+    def clear(self):
+        self.version = None
+        self._entries = OrderedDict()
+    
+    def get(self, key: Hashable, version: int) -> Optional[dict]:
+        if version != self.version:
+            self.version = version
+            self._entries = OrderedDict()
+        
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return result
+    
+    def put(self, key: Hashable, version: int, result: dict):
+        if version != self.version or self.maxsize <= 0:
+            return
+        
+        self._entries[key] = result
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+def _order_month(created_at) -> str:
+    if isinstance(created_at, datetime):
+        return created_at.strftime('%Y-%m')
+    return str(created_at or '')[:7] or 'unknown'
+
+class SimulationTotals:
+    """Running per (color class, month) sums of a what-if simulation"""
+    COLUMNS = ('items', 'recorded', 'current', 'candidate')
+    
+    def __init__(self):
+        self.groups: Dict[Tuple[str, str], int] = {}
+        self.sums = np.zeros((len(self.COLUMNS), 0))
+    
+    def add(self, keys: List[Tuple[str, str]], recorded: np.ndarray, current: np.ndarray, candidate: np.ndarray):
+        inverse = np.array([self.groups.setdefault(key, len(self.groups)) for key in keys], dtype=np.int64)
+        size = len(self.groups)
+        if self.sums.shape[1] < size:
+            self.sums = np.pad(self.sums, ((0, 0), (0, size - self.sums.shape[1])))
+        
+        self.sums[0] += np.bincount(inverse, minlength=size)
+        for row, values in enumerate((recorded, current, candidate), start=1):
+            self.sums[row] += np.bincount(inverse, weights=values, minlength=size)
+    
+    def _rows(self, key_names: Tuple[str, ...], key_fn) -> List[dict]:
+        merged: Dict[tuple, np.ndarray] = {}
+        for key, index in self.groups.items():
+            merged_key = key_fn(key)
+            merged[merged_key] = merged.get(merged_key, 0) + self.sums[:, index]
+        
+        rows = []
+        for key, sums in sorted(merged.items()):
+            row = dict(zip(key_names, key))
+            row.update({column: round(float(value), 2) for column, value in zip(self.COLUMNS, sums)})
+            row['items'] = int(row['items'])
+            row['delta'] = round(row['candidate'] - row['current'], 2)
+            rows.append(row)
+        return rows
+    
+    def report(self) -> dict:
+        totals = self._rows((), lambda key: ())
+        return {
+            "totals": totals[0] if totals else {
+                "items": 0, "recorded": 0, "current": 0, "candidate": 0, "delta": 0
+            },
+            "by_color_class": self._rows(("color_class",), lambda key: key[:1]),
+            "by_month": self._rows(("month",), lambda key: key[1:]),
+            "by_color_class_month": self._rows(("color_class", "month"), lambda key: key)
+        }
+
+class PricingEngine:
+    def __init__(self, database, quote_cache_size: int = PRICING_QUOTE_CACHE_SIZE):
+        self.db = database
+        self._snapshot: Optional[PricingSnapshot] = None
+        self._loading: Optional[asyncio.Future] = None
+        self._index_ready = False
+        self.quote_cache = QuoteCache(quote_cache_size)
+    
+    # Read path
+
+    async def _fetch_config(self) -> Optional[dict]:
+        return await self.db.pricing_config.find_one({"id": CONFIG_ID}, {"_id": 0})
+
+    async def ensure_index(self):
+        """Unique index on pricing_config.id so seeding can never duplicate it"""
+        if not self._index_ready:
+            await ensure_indexes(self.db, indexes_by_collection()["pricing_config"])
+            self._index_ready = True
+
+    async def _seed_config(self) -> dict:
+        """Insert the hardcoded defaults unless a config already exists.
+        
+        The upsert only sets fields on insert, so concurrent seeders (other
+        workers included) converge on a single document.
+        """
+        await self.ensure_index()
+        try:
+            await self.db.pricing_config.update_one(
+                {"id": CONFIG_ID},
+                {"$setOnInsert": {**default_pricing_data(), "version": 0}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another worker inserted it between our match and insert
+            pass
+        return await self._fetch_config()
+
+    async def _load_snapshot(self) -> PricingSnapshot:
+        pricing_doc = await self._fetch_config()
+        
+        if not pricing_doc:
+            # Initialize from hardcoded values
+            pricing_doc = await self._seed_config()
+        
+        return PricingSnapshot.build(pricing_doc)
+
+    async def _refresh(self, stale: Optional[PricingSnapshot]) -> PricingSnapshot:
+        try:
+            if stale is not None:
+                version_doc = await self.db.pricing_config.find_one(
+                    {"id": CONFIG_ID}, {"_id": 0, "version": 1}
+                )
+                if version_doc and version_doc.get('version', 0) == stale.version:
+                    snapshot = replace(stale, loaded_at=time.monotonic())
+                else:
+                    snapshot = await self._load_snapshot()
+            else:
+                snapshot = await self._load_snapshot()
+            
+            # An invalidate() while loading starts a new load; don't overwrite it
+            if self._loading is asyncio.current_task():
+                self._snapshot = snapshot
+            return snapshot
+        finally:
+            if self._loading is asyncio.current_task():
+                self._loading = None
+
+    async def snapshot(self) -> PricingSnapshot:
+        """Return the cached pricing snapshot, reloading it once it may be stale.
+        
+        Within PRICING_CACHE_TTL no database call is made. After that only the
+        version field is read, and the full document is fetched again only when
+        another worker (or an admin edit) has bumped it. Concurrent callers
+        share a single in-flight load instead of each querying (and possibly
+        seeding) the collection.
+        """
+        snapshot = self._snapshot
+        
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < PRICING_CACHE_TTL:
+            return snapshot
+        
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._refresh(snapshot))
+        
+        # Shield so one cancelled request doesn't cancel the load for everyone
+        return await asyncio.shield(self._loading)
+
+    def invalidate(self):
+        """Drop this worker's snapshot; called after every pricing_config write"""
+        self._snapshot = None
+        self._loading = None
+        self.quote_cache.clear()
+
+    async def get_config(self) -> dict:
+        snapshot = await self.snapshot()
+        return dict(snapshot.config)
+
+    async def quote(self, color_class: str, print_type: str, pages: int, copies: int, service: str = 'none') -> dict:
+        snapshot = await self.snapshot()
+        key = (color_class, print_type, pages, copies, service, snapshot.version)
+        
+        result = self.quote_cache.get(key, snapshot.version)
+        if result is None:
+            result = calculate_quote(snapshot, color_class, print_type, pages, copies, service)
+            self.quote_cache.put(key, snapshot.version, result)
+        
+        return result
+
+    async def self_test(self) -> int:
+        """Quote the lowest tier of every color class through both the scalar
+        and the vectorized path and check they agree; returns the number of
+        quotes checked. Raises PricingConfigError on a mismatch."""
+        snapshot = await self.snapshot()
+        cases = [(color_class, int(max(1, tiers.mins[0]))) for color_class, tiers in snapshot.tiers.items() if tiers.mins]
+        if not cases:
+            return 0
+        
+        color_classes = [color_class for color_class, _ in cases]
+        pages = [total_pages for _, total_pages in cases]
+        batch = snapshot.table.quote(color_classes, ['single'] * len(cases), pages, [1] * len(cases), ['none'] * len(cases))
+        
+        for i, (color_class, total_pages) in enumerate(cases):
+            expected = calculate_quote(snapshot, color_class, 'single', total_pages, 1, 'none')['total']
+            if not math.isclose(expected, float(batch['total'][i])):
+                raise PricingConfigError(
+                    f"self-test quote for {color_class} x {total_pages} pages: "
+                    f"scalar {expected}, vectorized {float(batch['total'][i])}"
+                )
+        
+        return len(cases)
+
+    async def quote_batch(
+        self,
+        color_classes: Sequence[str],
+        print_types: Sequence[str],
+        pages: Sequence[int],
+        copies: Sequence[int],
+        services: Sequence[str]
+    ) -> List[dict]:
+        """Quote many items at once, evaluated column-wise with NumPy"""
+        snapshot = await self.snapshot()
+        quote = snapshot.table.quote(color_classes, print_types, pages, copies, services)
+        
+        columns = {name: values.tolist() for name, values in quote.items()}
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    # What-if simulation
+
+    async def simulate(
+        self,
+        candidate_tiers: Mapping[str, List[dict]],
+        query: Optional[dict] = None,
+        batch_size: int = SIMULATION_BATCH_SIZE
+    ) -> dict:
+        """Re-price historical order items under current and candidate tiers.
+        
+        ``candidate_tiers`` overrides the tiers of the given color classes;
+        the rest keep their current tiers. Orders are streamed from a cursor
+        and priced ``batch_size`` items at a time, so memory does not grow
+        with the size of the collection.
+        """
+        snapshot = await self.snapshot()
+        candidate = compile_pricing_tiers({**snapshot.config.get('pricing_tiers', {}), **candidate_tiers})
+        candidate_table = build_price_table(candidate, snapshot.services)
+        totals = SimulationTotals()
+        order_count = 0
+        
+        fields = ('color_class', 'print_type', 'pages', 'copies', 'service')
+        columns = {field: [] for field in fields}
+        recorded, keys = [], []
+
+        def flush():
+            if not keys:
+                return
+            current = snapshot.table.quote(*(columns[field] for field in fields))['total']
+            proposed = candidate_table.quote(*(columns[field] for field in fields))['total']
+            totals.add(keys, np.array(recorded, dtype=np.float64), current, proposed)
+            for values in columns.values():
+                values.clear()
+            recorded.clear()
+            keys.clear()
+        
+        projection = {"_id": 0, "created_at": 1, "items.total_price": 1}
+        projection.update({f"items.{field}": 1 for field in fields})
+        cursor = self.db.orders.find(query or {}, projection).batch_size(batch_size)
+        
+        async for order in cursor:
+            order_count += 1
+            month = _order_month(order.get('created_at'))
+            for item in order.get('items', []):
+                columns['color_class'].append(item.get('color_class'))
+                columns['print_type'].append(item.get('print_type'))
+                columns['pages'].append(item.get('pages', 0))
+                columns['copies'].append(item.get('copies', 0))
+                columns['service'].append(item.get('service', 'none'))
+                recorded.append(item.get('total_price', 0))
+                keys.append((item.get('color_class'), month))
+            if len(keys) >= batch_size:
+                flush()
+        flush()
+        
+        return {"pricing_version": snapshot.version, "orders": order_count, **totals.report()}
+
+    # Write path
+
+    async def _write(self, update: dict, change_type: str, admin_id: Optional[str], log: dict, upsert: bool = False):
+        await self.db.pricing_config.update_one(
+            {"id": CONFIG_ID},
+            {**update, "$inc": {"version": 1}},
+            upsert=upsert
+        )
+        self.invalidate()
+        
+        # Log the change
+        await self.db.pricing_logs.insert_one({
+            "type": change_type,
+            "admin_id": admin_id,
+            "timestamp": datetime.utcnow(),
+            **log
+        })
+
+    async def _current_config(self) -> dict:
+        # Edits start from the stored document, not this worker's snapshot
+        pricing_doc = await self._fetch_config()
+        if not pricing_doc:
+            pricing_doc = await self._seed_config()
+        return pricing_doc
+
+    async def reset(self, admin_id: Optional[str] = None) -> dict:
+        """Initialize or reset pricing to the hardcoded defaults"""
+        pricing_data = default_pricing_data()
+        await self.ensure_index()
+        await self._write({"$set": pricing_data}, "pricing_reset", admin_id, {}, upsert=True)
+        return pricing_data
+
+    async def update_tier(self, color_class_id: str, tier_index: int, tier: dict, admin_id: Optional[str] = None) -> CompiledTiers:
+        """Replace one tier of a color class; raises LookupError for an unknown
+        color class or tier and PricingConfigError if the tiers no longer compile"""
+        pricing_doc = await self._current_config()
+        pricing_tiers = pricing_doc.get('pricing_tiers', {})
+        
+        if color_class_id not in pricing_tiers:
+            raise LookupError("کلاس رنگی پیدا نشد")
+        
+        tiers = list(pricing_tiers[color_class_id])
+        
+        if tier_index < 0 or tier_index >= len(tiers):
+            raise LookupError("رده قیمتی پیدا نشد")
+        
+        tiers[tier_index] = tier
+        compiled = compile_tiers(color_class_id, tiers)
+        
+        await self._write(
+            {"$set": {f"pricing_tiers.{color_class_id}": tiers}},
+            "pricing_update",
+            admin_id,
+            {"color_class_id": color_class_id, "data": {"color_class_id": color_class_id, "tiers": tiers}}
+        )
+        return compiled
+
+    async def update_service(
+        self,
+        service_id: str,
+        price: float,
+        min_pages: Optional[int] = None,
+        admin_id: Optional[str] = None
+    ) -> dict:
+        """Update an existing service's price.
+        
+        A ``min_pages`` of None keeps the service's existing minimum.
+        """
+        pricing_doc = await self._current_config()
+        services = pricing_doc.get('services', [])
+        service = next((s for s in services if s['id'] == service_id), None)
+        
+        if service is None:
+            raise LookupError("خدمت پیدا نشد")
+        
+        service['price'] = price
+        if min_pages is not None:
+            service['min_pages'] = min_pages
+        
+        await self._write(
+            {"$set": {"services": services}},
+            "service_update",
+            admin_id,
+            {"service_id": service_id, "data": service}
+        )
+        return service
+
+pricing_engine = PricingEngine(db)
@@ -0,0 +1,26 @@
+"""Trusted-read responses.
+
+Orders, carts and the other documents served here were written by this
+backend from validated models, so reading them back through the same models
+(and again through FastAPI's ``response_model``) only costs time. Handlers
+on the hot read paths instead ask MongoDB for exactly the response model's
+fields and hand the documents straight to orjson.
+
+``response_model`` stays on those routes for the OpenAPI schema; FastAPI
+skips it when a handler returns a Response itself.
+"""
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from typing import Dict, Optional, Type
+
+def model_projection(model: Type[BaseModel], *extra: str) -> Dict[str, int]:
+    """MongoDB projection returning the fields of ``model`` (plus ``extra``)
+    and nothing else, so no stray field or ``_id`` reaches the client"""
+    projection = {"_id": 0}
+    projection.update({name: 1 for name in model.model_fields})
+    projection.update({name: 1 for name in extra})
+    return projection
+
+def trusted_response(content, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """Serialize documents we wrote ourselves without re-validating them"""
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
\ No newline at end of file